@@ -0,0 +1,252 @@
+import math
+
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+from roi_stats import as_measurement, describe, handles, outline
+
+# Grid cell size (image pixels) of the hit-testing index
+GRID_CELL_SIZE = 32.0
+# How close (screen pixels) the pointer must be to pick an annotation
+PICK_RADIUS_PX = 6
+# Text is by far the most expensive artist; above this many labels in view
+# only the selected one is drawn (the hovered one is always blitted)
+MAX_VISIBLE_LABELS = 40
+
+LINE_COLOR = 'g'
+SELECTED_COLOR = 'cyan'
+
+
+def _distance_to_segment(x, y, x0, y0, x1, y1):
+    dx, dy = x1 - x0, y1 - y0
+    length_sq = dx * dx + dy * dy
+    t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((x - x0) * dx + (y - y0) * dy) / length_sq))
+    return math.hypot(x - (x0 + t * dx), y - (y0 + t * dy))
+
+
+class SegmentGrid:
+    # Uniform grid over shape bounding boxes. A shape is a line or an ROI
+    # outline plus its draggable handles. Inserts, removals and point
+    # queries only touch the cells involved, independent of how many
+    # shapes there are.
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.shapes = {}
+        self.bounds = {}
+
+    def _cell_range(self, x0, y0, x1, y1):
+        size = self.cell_size
+        for cx in range(int(math.floor(min(x0, x1) / size)), int(math.floor(max(x0, x1) / size)) + 1):
+            for cy in range(int(math.floor(min(y0, y1) / size)), int(math.floor(max(y0, y1) / size)) + 1):
+                yield cx, cy
+
+    def insert(self, key, vertices, closed=False, handle_points=()):
+        self.shapes[key] = (vertices, closed, handle_points)
+        xs = [x for x, _ in vertices] + [x for x, _ in handle_points]
+        ys = [y for _, y in vertices] + [y for _, y in handle_points]
+        self.bounds[key] = (min(xs), min(ys), max(xs), max(ys))
+        for cell in self._cell_range(*self.bounds[key]):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        self.shapes.pop(key, None)
+        bounds = self.bounds.pop(key, None)
+        if bounds is None:
+            return
+        for cell in self._cell_range(*bounds):
+            keys = self.cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.cells[cell]
+
+    def nearest(self, x, y, radius):
+        # (key, part) of the closest shape within radius, where part is the
+        # index of a handle and None for the outline
+        candidates = set()
+        for cell in self._cell_range(x - radius, y - radius, x + radius, y + radius):
+            candidates.update(self.cells.get(cell, ()))
+        best = None
+        best_distance = radius
+        for key in candidates:
+            vertices, closed, handle_points = self.shapes[key]
+            for part, (px, py) in enumerate(handle_points):
+                distance = math.hypot(x - px, y - py)
+                if distance <= best_distance:
+                    best, best_distance = (key, part), distance
+            if best is not None and best[0] == key:
+                continue
+            edges = list(zip(vertices, vertices[1:] + vertices[:1] if closed else vertices[1:]))
+            for (x0, y0), (x1, y1) in edges:
+                distance = _distance_to_segment(x, y, x0, y0, x1, y1)
+                if distance < best_distance:
+                    best, best_distance = (key, None), distance
+        return best
+
+
+class AnnotationLayer:
+    # All measurements (lines and ROI outlines) of the current image drawn
+    # through one LineCollection and one marker artist for the handles, so
+    # a redraw costs the same with 5 or 500 of them. Labels are Text
+    # artists, but only those inside the view (up to MAX_VISIBLE_LABELS)
+    # are drawn, and they are only culled again when the view or the
+    # annotations change. Annotations are kept by key, so selecting,
+    # editing and deleting one doesn't depend on how many there are;
+    # self.measurements lists them for the rest of the viewer (see roi_stats).
+    def __init__(self, ax):
+        self.ax = ax
+        self.lines = LineCollection([], colors=LINE_COLOR, linewidths=1.5)
+        ax.add_collection(self.lines, autolim=False)
+        self.points = Line2D([], [], color=LINE_COLOR, marker='o', markersize=6, linestyle='None')
+        ax.add_line(self.points)
+        # Hover highlight, animated so it is blitted rather than redrawn
+        self.highlight = Line2D([], [], color='yellow', linewidth=3, alpha=0.7, animated=True, visible=False)
+        ax.add_line(self.highlight)
+        self.hover_label = ax.text(0, 0, "", color='yellow', fontsize=10, animated=True, visible=False,
+                                   bbox=dict(facecolor='black', alpha=0.5))
+        self.entries = {}  # key -> [store row id or None, measurement], in the order added
+        self.labels = {}
+        self.paths = {}
+        self.grid = SegmentGrid()
+        self.next_key = 0
+        self.selected = None
+        self.hovered = None
+        self.dirty = False
+        self.culled_view = None  # view limits the labels were last culled for
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def measurements(self):
+        return [measurement for _, measurement in self.entries.values()]
+
+    def set(self, entries):
+        # entries are (store row id or None, measurement) pairs
+        for label in self.labels.values():
+            label.remove()
+        self.entries = {}
+        self.labels = {}
+        self.paths = {}
+        self.grid = SegmentGrid()
+        self.selected = None
+        self.set_hover(None)
+        for row_id, measurement in entries:
+            self.add(measurement, row_id)
+        self.dirty = True
+
+    def add(self, measurement, row_id=None):
+        measurement = as_measurement(measurement)
+        key = self.next_key
+        self.next_key += 1
+        self.entries[key] = [row_id, measurement]
+        self.labels[key] = self.ax.text(0, 0, "", color='yellow', fontsize=10,
+                                        bbox=dict(facecolor='black', alpha=0.5))
+        self._index(key, measurement)
+        self.dirty = True
+        return key
+
+    def update(self, key, measurement):
+        entry = self.entries[key]
+        entry[1][:] = as_measurement(measurement)
+        self.grid.remove(key)
+        self._index(key, entry[1])
+        if self.hovered == key:
+            self.set_hover(None)
+        self.dirty = True
+
+    def remove(self, key):
+        # Returns the (row id, measurement) that was removed
+        row_id, measurement = self.entries.pop(key)
+        self.grid.remove(key)
+        self.paths.pop(key)
+        self.labels.pop(key).remove()
+        if self.selected == key:
+            self.selected = None
+        if self.hovered == key:
+            self.set_hover(None)
+        self.dirty = True
+        return row_id, measurement
+
+    def row_id(self, key):
+        return self.entries[key][0]
+
+    def measurement(self, key):
+        return self.entries[key][1]
+
+    def _index(self, key, measurement):
+        vertices, closed = outline(measurement)
+        self.grid.insert(key, vertices, closed, handles(measurement))
+        self.paths[key] = np.array(vertices + vertices[:1] if closed else vertices, dtype=float)
+        label = self.labels[key]
+        label.set_position(((measurement[1] + measurement[3]) / 2, (measurement[2] + measurement[4]) / 2))
+        label.set_text(describe(measurement))
+
+    def pick_radius(self):
+        # PICK_RADIUS_PX expressed in data units at the current zoom
+        inverse = self.ax.transData.inverted()
+        (x0, _), (x1, _) = inverse.transform([(0, 0), (PICK_RADIUS_PX, 0)])
+        return abs(x1 - x0)
+
+    def hit_test(self, x, y):
+        if x is None or y is None or not self.entries:
+            return None
+        return self.grid.nearest(x, y, self.pick_radius())
+
+    def select(self, key):
+        # Returns True if the selection changed (and a full render is needed)
+        if key == self.selected:
+            return False
+        self.selected = key
+        self.dirty = True
+        return True
+
+    def set_hover(self, key):
+        # Returns True if the highlight changed (a blit is enough)
+        if key == self.hovered:
+            return False
+        self.hovered = key
+        if key is None:
+            self.highlight.set_visible(False)
+            self.hover_label.set_visible(False)
+        else:
+            path = self.paths[key]
+            self.highlight.set_data(path[:, 0], path[:, 1])
+            self.highlight.set_visible(True)
+            label = self.labels[key]
+            self.hover_label.set_position(label.get_position())
+            self.hover_label.set_text(label.get_text())
+            self.hover_label.set_visible(not label.get_visible())
+        return True
+
+    def sync(self):
+        # Pushes changes into the collection artists; called once per full
+        # render, not per edit
+        view = (tuple(self.ax.get_xlim()), tuple(self.ax.get_ylim()))
+        if self.dirty or view != self.culled_view:
+            self.cull_labels(view)
+        if self.dirty:
+            self.dirty = False
+            self.lines.set_segments([self.paths[key] for key in self.entries])
+            colors = [SELECTED_COLOR if key == self.selected else LINE_COLOR for key in self.entries]
+            self.lines.set_color(colors or LINE_COLOR)
+            points = np.array([point for key in self.entries for point in self.grid.shapes[key][2]],
+                              dtype=float).reshape(-1, 2)
+            self.points.set_data(points[:, 0], points[:, 1])
+
+    def cull_labels(self, view):
+        self.culled_view = view
+        if not self.labels:
+            return
+        (xa, xb), (ya, yb) = sorted(view[0]), sorted(view[1])
+        in_view = set()
+        for key, label in self.labels.items():
+            x, y = label.get_position()
+            if xa <= x <= xb and ya <= y <= yb:
+                in_view.add(key)
+        if len(in_view) > MAX_VISIBLE_LABELS:
+            in_view &= {self.selected}
+        for key, label in self.labels.items():
+            label.set_visible(key in in_view)
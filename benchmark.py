@@ -0,0 +1,416 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import matplotlib
+import pydicom
+from matplotlib.backend_bases import MouseEvent
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import (ExplicitVRLittleEndian, ImplicitVRLittleEndian, JPEG2000Lossless, RLELossless,
+                         SecondaryCaptureImageStorage, generate_uid)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRANSFER_SYNTAXES = {
+    "explicit": ExplicitVRLittleEndian,
+    "implicit": ImplicitVRLittleEndian,
+    "rle": RLELossless,
+    "jpeg2000": JPEG2000Lossless,
+}
+
+# (label, rows, columns, frames, bits, signed, transfer syntax)
+DEFAULT_CASES = [
+    ("ct-512-int16", 512, 512, 1, 16, True, "explicit"),
+    ("ct-512-int16-implicit", 512, 512, 1, 16, True, "implicit"),
+    ("ct-512-int16-rle", 512, 512, 1, 16, True, "rle"),
+    ("ct-512-int16-j2k", 512, 512, 1, 16, True, "jpeg2000"),
+    ("us-256-uint8", 256, 256, 1, 8, False, "explicit"),
+    ("cr-2048-uint16", 2048, 2048, 1, 16, False, "explicit"),
+    ("cine-512x30-uint8", 512, 512, 30, 8, False, "explicit"),
+    ("xa-1024x60-uint16", 1024, 1024, 60, 16, False, "explicit"),
+    ("mr-256x60-int16-rle", 256, 256, 60, 16, True, "rle"),
+]
+LARGE_CASES = [
+    ("mg-4096-uint16", 4096, 4096, 1, 16, False, "explicit"),
+    ("ct-512x800-int16", 512, 512, 800, 16, True, "explicit"),
+]
+QUICK_CASES = [
+    ("ct-256-int16", 256, 256, 1, 16, True, "explicit"),
+    ("ct-256-int16-rle", 256, 256, 1, 16, True, "rle"),
+    ("cine-128x10-uint8", 128, 128, 10, 8, False, "explicit"),
+]
+
+DRAG_STEPS = 60
+PAN_STEPS = 30
+SCROLL_STEPS = 10
+ANNOTATION_COUNT = 300
+HOVER_STEPS = 60
+MPR_STEPS = 30
+CINE_FPS = 30.0
+CINE_SECONDS = 2.0
+
+
+def make_synthetic_dicom(path, rows, columns, frames=1, bits=16, signed=True, transfer_syntax="explicit"):
+    # A smooth phantom plus noise, so compressed syntaxes have realistic ratios
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:rows, 0:columns]
+    radius = np.hypot(x - columns / 2, y - rows / 2) / (min(rows, columns) / 2)
+    high = (1 << (bits - 1)) - 1 if signed else (1 << bits) - 1
+    base = np.clip(1.0 - radius, 0, 1) * high * 0.8
+    dtype = np.dtype(f"{'i' if signed else 'u'}{bits // 8}")
+    pixels = np.empty((frames, rows, columns), dtype=dtype)
+    for i in range(frames):
+        noise = rng.normal(0, high * 0.01, size=(rows, columns))
+        pixels[i] = np.clip(base * (0.5 + 0.5 * (i + 1) / frames) + noise, 0, high).astype(dtype)
+
+    uid = generate_uid()
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+    meta.MediaStorageSOPInstanceUID = uid
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = SecondaryCaptureImageStorage
+    ds.SOPInstanceUID = uid
+    ds.PatientName = "Benchmark^Synthetic"
+    ds.PatientID = "BENCH"
+    ds.StudyInstanceUID = generate_uid()
+    ds.SeriesInstanceUID = generate_uid()
+    ds.Modality = "OT"
+    ds.Rows = rows
+    ds.Columns = columns
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = bits
+    ds.BitsStored = bits
+    ds.HighBit = bits - 1
+    ds.PixelRepresentation = 1 if signed else 0
+    ds.PixelSpacing = [0.5, 0.5]
+    if signed:
+        ds.RescaleSlope = 1
+        ds.RescaleIntercept = -1024
+    if frames > 1:
+        ds.NumberOfFrames = frames
+        ds.PixelData = pixels.tobytes()
+    else:
+        ds.PixelData = pixels[0].tobytes()
+
+    syntax = TRANSFER_SYNTAXES[transfer_syntax]
+    if syntax.is_compressed:
+        ds.compress(syntax)  # raises if no encoder plugin is installed
+    elif syntax != ExplicitVRLittleEndian:
+        ds.file_meta.TransferSyntaxUID = syntax
+    try:
+        ds.save_as(path, enforce_file_format=True)
+    except TypeError:
+        # pydicom < 3 takes write_like_original, and the encoding from the
+        # dataset rather than the file meta
+        ds.is_little_endian = syntax.is_little_endian
+        ds.is_implicit_VR = syntax.is_implicit_VR
+        ds.save_as(path, write_like_original=False)
+    return path
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def latency_stats(samples):
+    samples = np.array(samples) * 1000.0
+    return {
+        "count": int(samples.size),
+        "total_ms": float(samples.sum()),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "max_ms": float(samples.max()),
+    }
+
+
+def mouse_event(canvas, name, xdata, ydata, button=None, key=None):
+    x, y = canvas.ax.transData.transform((xdata, ydata))
+    return MouseEvent(name, canvas, x, y, button=button, key=key)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def run_case(path, frames):
+    # Runs in a fresh process so peak RSS belongs to this case alone
+    from dicom_canvas import HeadlessDicomCanvas
+    from measurement_store import MeasurementStore
+    from mpr import HeadlessMprCanvas, MprController
+    from reporting import build_report_text, write_report_pdf
+    from viewports import LINK_KINDS, ViewportLink
+    from volume import AXIAL, CORONAL, SAGITTAL, Volume
+    # reportlab loads lazily on the first PDF; keep that out of the PDF timing
+    import reportlab.pdfgen.canvas  # noqa: F401
+
+    timings = {}
+    canvas = HeadlessDicomCanvas(defer=True)
+    canvas.measurement_store = MeasurementStore(":memory:")
+
+    timings["load_dicom_s"], _ = timed(canvas.load_dicom, path)
+    timings["first_paint_s"], _ = timed(canvas.run_pending)
+    rows, columns = canvas.raw_frame.shape[:2]
+
+    # Rubber-band measurement drag, rendering after every event (worst case)
+    samples = []
+    canvas.on_mouse_press(mouse_event(canvas, "button_press_event", columns * 0.25, rows * 0.25, button=1))
+    for step in range(1, DRAG_STEPS + 1):
+        t = 0.25 + 0.5 * step / DRAG_STEPS
+        event = mouse_event(canvas, "motion_notify_event", columns * t, rows * t)
+        start = time.perf_counter()
+        canvas.on_mouse_move(event)
+        canvas.run_pending()
+        samples.append(time.perf_counter() - start)
+    canvas.on_mouse_release(mouse_event(canvas, "button_release_event", columns * 0.75, rows * 0.75, button=1))
+    canvas.run_pending()
+    timings["drag"] = latency_stats(samples)
+
+    # Right-button pan, moving a few display pixels per event
+    samples = []
+    press = mouse_event(canvas, "button_press_event", columns * 0.5, rows * 0.5, button=3)
+    canvas.on_mouse_press(press)
+    for step in range(1, PAN_STEPS + 1):
+        event = MouseEvent("motion_notify_event", canvas, press.x + 3 * step, press.y + 2 * step)
+        start = time.perf_counter()
+        canvas.on_mouse_move(event)
+        canvas.run_pending()
+        samples.append(time.perf_counter() - start)
+    canvas.on_mouse_release(MouseEvent("button_release_event", canvas, press.x, press.y, button=3))
+    timings["pan"] = latency_stats(samples)
+
+    # Zoom in and back out around the centre
+    samples = []
+    for button in ["up"] * SCROLL_STEPS + ["down"] * SCROLL_STEPS:
+        event = mouse_event(canvas, "scroll_event", columns * 0.5, rows * 0.5, button=button)
+        start = time.perf_counter()
+        canvas.on_scroll(event)
+        canvas.run_pending()
+        samples.append(time.perf_counter() - start)
+    timings["scroll"] = latency_stats(samples)
+
+    # Window/level drag with the middle button
+    samples = []
+    canvas.on_mouse_press(mouse_event(canvas, "button_press_event", columns * 0.5, rows * 0.5, button=2))
+    for step in range(1, DRAG_STEPS + 1):
+        t = 0.5 + 0.2 * step / DRAG_STEPS
+        event = mouse_event(canvas, "motion_notify_event", columns * t, rows * t)
+        start = time.perf_counter()
+        canvas.on_mouse_move(event)
+        canvas.run_pending()
+        samples.append(time.perf_counter() - start)
+    canvas.on_mouse_release(mouse_event(canvas, "button_release_event", columns * 0.7, rows * 0.7, button=2))
+    timings["window_level"] = latency_stats(samples)
+
+    if frames > 1:
+        samples = []
+        for index in range(len(canvas.stack)):
+            start = time.perf_counter()
+            canvas.show_slice(index)
+            canvas.run_pending()
+            samples.append(time.perf_counter() - start)
+        timings["slice_browse"] = latency_stats(samples)
+
+        # Cine playback against the wall clock, as the Tk loop would run it
+        canvas.cine_fps = CINE_FPS
+        canvas.start_cine()
+        end = time.perf_counter() + CINE_SECONDS
+        while time.perf_counter() < end:
+            canvas.run_pending()
+            time.sleep(0.001)
+        timings["cine_fps"] = canvas.cine.actual_fps()
+        timings["cine_dropped"] = canvas.cine.dropped
+        canvas.stop_cine()
+        canvas.run_pending()
+
+        # Crosshair drag in the axial view of the three-plane MPR layout:
+        # per event two reformatted planes are redrawn and one is blitted
+        timings["mpr_volume_s"], volume = timed(Volume.from_stack, canvas.stack)
+        views = {orientation: HeadlessMprCanvas(defer=True) for orientation in (AXIAL, CORONAL, SAGITTAL)}
+        controller = MprController(volume, views, canvas.window, canvas.level)
+        for view in views.values():
+            view.run_pending()
+        samples = []
+        for step in range(1, MPR_STEPS + 1):
+            t = 0.25 + 0.5 * step / MPR_STEPS
+            start = time.perf_counter()
+            controller.move_to(AXIAL, columns * t, rows * (1 - t))
+            for view in views.values():
+                view.run_pending()
+            samples.append(time.perf_counter() - start)
+        timings["mpr_crosshair"] = latency_stats(samples)
+        volume.close()
+
+    # The generate_report / save_report_as_pdf pipeline
+    measurements = canvas.measurements * 20
+    start = time.perf_counter()
+    build_report_text(measurements)
+    image = canvas.snapshot_png()
+    timings["generate_report_s"] = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as out_dir:
+        timings["save_report_as_pdf_s"], _ = timed(write_report_pdf, os.path.join(out_dir, "report.pdf"),
+                                                   measurements, image)
+
+    # Hover hit-testing and full redraws with many annotations on the image
+    rng = np.random.default_rng(1)
+    for x, y in rng.uniform(0, 1, (ANNOTATION_COUNT, 2)) * (columns, rows):
+        canvas.annotations.add(["Annotation", x, y, x + 5, y + 5, 7.1])
+    canvas.request_render(full=True)
+    canvas.run_pending()
+    samples = []
+    for x, y in rng.uniform(0, 1, (HOVER_STEPS, 2)) * (columns, rows):
+        event = mouse_event(canvas, "motion_notify_event", x, y)
+        start = time.perf_counter()
+        canvas.on_mouse_move(event)
+        canvas.run_pending()
+        samples.append(time.perf_counter() - start)
+    timings["annotated_hover"] = latency_stats(samples)
+    samples = []
+    for _ in range(SCROLL_STEPS):
+        start = time.perf_counter()
+        canvas.request_render(full=True)
+        canvas.run_pending()
+        samples.append(time.perf_counter() - start)
+    timings["annotated_redraw"] = latency_stats(samples)
+
+    # 1x2 layout on one shared frame cache with everything linked: a pan in
+    # the first viewport is redrawn there and blitted in the second
+    leader = HeadlessDicomCanvas(defer=True)
+    follower = HeadlessDicomCanvas(defer=True, frame_cache=leader.frame_cache)
+    leader.load_dicom(path)
+    leader.run_pending()
+    timings["linked_second_load_s"], _ = timed(follower.load_dicom, path)
+    follower.run_pending()
+    link = ViewportLink(LINK_KINDS)
+    link.add(leader)
+    link.add(follower)
+    samples = []
+    press = mouse_event(leader, "button_press_event", columns * 0.5, rows * 0.5, button=3)
+    leader.on_mouse_press(press)
+    for step in range(1, PAN_STEPS + 1):
+        event = MouseEvent("motion_notify_event", leader, press.x + 3 * step, press.y + 2 * step)
+        leader.on_mouse_move(event)
+        leader.run_pending()
+        start = time.perf_counter()
+        follower.run_pending()
+        samples.append(time.perf_counter() - start)
+    leader.on_mouse_release(MouseEvent("button_release_event", leader, press.x, press.y, button=3))
+    timings["linked_pan_follower"] = latency_stats(samples)
+
+    return {"timings": timings, "peak_rss_mb": peak_rss_mb()}
+
+
+def _run_case_worker(result_queue, path, frames):
+    try:
+        result_queue.put(run_case(path, frames))
+    except Exception as e:
+        result_queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_isolated(path, frames):
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=_run_case_worker, args=(result_queue, path, frames))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def run_benchmarks(cases, repeat=1):
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for label, rows, columns, frames, bits, signed, syntax in cases:
+            case = {"label": label, "rows": rows, "columns": columns, "frames": frames,
+                    "bits": bits, "signed": signed, "transfer_syntax": syntax}
+            path = os.path.join(work_dir, f"{label}.dcm")
+            try:
+                make_synthetic_dicom(path, rows, columns, frames, bits, signed, syntax)
+            except Exception as e:
+                results.append({"case": case, "skipped": f"{type(e).__name__}: {e}"})
+                print(f"{label}: skipped ({e})", file=sys.stderr)
+                continue
+            case["file_bytes"] = os.path.getsize(path)
+            runs = [run_isolated(path, frames) for _ in range(repeat)]
+            results.append({"case": case, "runs": runs})
+            print(f"{label}: done", file=sys.stderr)
+    return results
+
+
+def compare(baseline, current):
+    # Prints the current/baseline ratio of every timing present in both runs
+    def flatten(report):
+        values = {}
+        for result in report["results"]:
+            for run in result.get("runs", [])[:1]:
+                for name, value in run.get("timings", {}).items():
+                    key = f"{result['case']['label']}.{name}"
+                    values[key] = value["mean_ms"] / 1000.0 if isinstance(value, dict) else value
+                if run.get("peak_rss_mb") is not None:
+                    values[f"{result['case']['label']}.peak_rss_mb"] = run["peak_rss_mb"]
+        return values
+
+    old, new = flatten(baseline), flatten(current)
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key] / old[key] if old[key] else float("nan")
+        flag = "  <-- slower" if ratio > 1.2 else ""
+        print(f"{key:60s} {old[key]:12.4f} {new[key]:12.4f} {ratio:7.2f}x{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the DICOM viewer hot paths")
+    parser.add_argument("--output", "-o", help="write JSON results here instead of stdout")
+    parser.add_argument("--quick", action="store_true", help="small images only")
+    parser.add_argument("--large", action="store_true", help="include very large images")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case")
+    parser.add_argument("--compare", help="baseline JSON to compare the results against")
+    args = parser.parse_args(argv)
+
+    cases = QUICK_CASES if args.quick else DEFAULT_CASES + (LARGE_CASES if args.large else [])
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "matplotlib": matplotlib.__version__,
+            "pydicom": pydicom.__version__,
+        },
+        "results": run_benchmarks(cases, args.repeat),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import threading
+import time
+
+import numpy as np
+
+from windowing import downsample
+
+# Playback rate when the header recommends none
+DEFAULT_CINE_FPS = 30.0
+# Memory budget of the prefetch ring buffer, and its bounds in frames
+CINE_BUFFER_BYTES = 64 * 1024 * 1024
+MIN_BUFFER_FRAMES = 4
+MAX_BUFFER_FRAMES = 64
+
+
+def cine_rate(ds):
+    # Frames per second recommended by the header, or None
+    for keyword in ("CineRate", "RecommendedDisplayFrameRate"):
+        try:
+            value = float(getattr(ds, keyword, 0) or 0)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            return value
+    try:
+        frame_time = float(getattr(ds, 'FrameTime', 0) or 0)  # ms per frame
+    except (TypeError, ValueError):
+        frame_time = 0
+    return 1000.0 / frame_time if frame_time > 0 else None
+
+
+class FrameRingBuffer:
+    # A fixed number of slots filled by a background thread with frames
+    # decoded in playback order, wrapping to the first frame when looping.
+    # The display side takes them in the same order and never blocks.
+    # Frames are block-averaged by factor on the way in, so the UI thread
+    # only windows and draws what fits on screen.
+    def __init__(self, stack, start, capacity, loop=True, factor=1):
+        self.stack = stack
+        self.capacity = capacity
+        self.loop = loop
+        self.factor = factor
+        self.slots = [None] * capacity
+        self.head = 0
+        self.count = 0
+        self.next_index = start
+        self.error = None
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._fill, name="cine-prefetch", daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def finished(self):
+        # Every frame has been taken (only happens without looping)
+        return self.next_index is None and self.count == 0
+
+    def _fill(self):
+        while True:
+            with self.condition:
+                while self.count == self.capacity and not self.stopped:
+                    self.condition.wait()
+                if self.stopped or self.next_index is None:
+                    return
+                index = self.next_index
+                following = index + 1
+                if following >= len(self.stack):
+                    following = 0 if self.loop else None
+                self.next_index = following
+            # Decode outside the lock; memory-mapped frames are read in now
+            # rather than paged in on the UI thread
+            try:
+                frame = downsample(self.stack.frame(index), self.factor)
+                if isinstance(frame, np.memmap):
+                    frame = np.array(frame)
+            except Exception as e:
+                with self.condition:
+                    self.error = e
+                    self.next_index = None
+                return
+            with self.condition:
+                if self.stopped:
+                    return
+                self.slots[(self.head + self.count) % self.capacity] = (index, frame)
+                self.count += 1
+
+    def take(self):
+        # The next (index, frame), or None if it isn't decoded yet
+        with self.condition:
+            if self.count == 0:
+                return None
+            item = self.slots[self.head]
+            self.slots[self.head] = None
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            self.condition.notify()
+            return item
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+
+class CinePlayer:
+    # Plays a canvas' stack against a wall clock: frame n is due n / fps
+    # seconds after the start. When the display falls behind, frames whose
+    # time has passed are skipped and counted as dropped, so playback keeps
+    # its rate instead of slowing down.
+    def __init__(self, canvas, fps=DEFAULT_CINE_FPS, loop=True, factor=1):
+        self.canvas = canvas
+        self.fps = fps
+        self.loop = loop
+        self.factor = factor
+        self.buffer = None
+        self.playing = False
+        self.shown = 0
+        self.dropped = 0
+        self.position = 0
+        self.started = None
+        self.began = None
+
+    def start(self, index):
+        stack = self.canvas.stack
+        frame_bytes = max(self.canvas.raw_frame.nbytes // (self.factor * self.factor), 1)
+        capacity = max(MIN_BUFFER_FRAMES, min(MAX_BUFFER_FRAMES, CINE_BUFFER_BYTES // frame_bytes, len(stack)))
+        self.buffer = FrameRingBuffer(stack, index, capacity, self.loop, self.factor)
+        self.playing = True
+        self.shown = 0
+        self.dropped = 0
+        self.position = 0
+        self.started = self.began = time.perf_counter()
+        self.canvas.schedule(0, self.tick)
+
+    def stop(self):
+        self.playing = False
+        if self.buffer is not None:
+            self.buffer.stop()
+
+    def set_fps(self, fps):
+        # Keeps the current frame due now, so the change doesn't skip frames
+        if self.started is not None:
+            self.started = time.perf_counter() - self.position / fps
+        self.fps = fps
+
+    def elapsed(self):
+        return time.perf_counter() - self.started if self.started is not None else 0.0
+
+    def actual_fps(self):
+        elapsed = time.perf_counter() - self.began if self.began is not None else 0.0
+        return self.shown / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def error(self):
+        return self.buffer.error if self.buffer is not None else None
+
+    def tick(self):
+        if not self.playing:
+            return
+        buffer = self.buffer
+        due = int(self.elapsed() * self.fps)
+        item = None
+        while self.position <= due:
+            taken = buffer.take()
+            if taken is None:
+                break  # the decoder is behind; show what we have
+            if item is not None:
+                self.dropped += 1
+            item = taken
+            self.position += 1
+        if item is not None:
+            self.shown += 1
+            self.canvas.show_cine_frame(*item)
+        if buffer.error is not None or buffer.finished:
+            self.canvas.stop_cine()
+            return
+        delay = (self.position / self.fps - self.elapsed()) * 1000.0
+        self.canvas.schedule(max(1, int(delay)), self.tick)
+
+    def summary(self):
+        return f"{self.actual_fps():.1f}/{self.fps:.0f} fps, {self.shown} shown, {self.dropped} dropped"
@@ -0,0 +1,860 @@
+import math
+import os
+import time
+import tkinter as tk
+
+import customtkinter as ctk
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from annotations import AnnotationLayer
+from cine import DEFAULT_CINE_FPS, CinePlayer, cine_rate
+from dicom_io import DicomStack, FrameCache, DEFAULT_CACHE_BYTES
+from instrumentation import Instrumentation
+from pyramid import PYRAMID_MIN_PIXELS, ImagePyramid
+from reporting import render_figure_png
+from roi_stats import (ELLIPSE, LINE, POLYGON, RECTANGLE, IntegralImage, describe, measure, measure_all,
+                       moved, outline, pixel_spacing, preview_stats, value_unit)
+from viewports import LINK_SLICE, LINK_VIEW, LINK_WINDOW
+from windowing import PRESETS, apply_window, default_window
+
+# Interactive updates are coalesced to at most one render per display frame
+FRAME_INTERVAL_MS = 16
+# Toggles the FPS / latency overlay (and turns instrumentation on)
+PERF_OVERLAY_KEY = 'f2'
+# Starts and stops cine playback of a multi-frame image or series
+CINE_KEY = ' '
+# Updates from linked viewports are blitted; one full redraw follows once
+# they have stopped for this long
+LINK_SETTLE_MS = 250
+
+TOOL_HINTS = {
+    LINE: "Click and drag to measure",
+    RECTANGLE: "Drag to draw a rectangle ROI",
+    ELLIPSE: "Drag to draw an ellipse ROI",
+    POLYGON: "Click to add polygon points, double-click to close",
+}
+
+
+class DicomCanvasMixin:
+    # Viewer behaviour shared by the Tk canvas and the headless Agg canvas.
+    # Subclasses create self.fig, initialise their FigureCanvas base, call
+    # init_viewer() and provide is_dark_mode, schedule and ask_measurement_name.
+    # Viewports of one layout pass the same frame_cache.
+    def init_viewer(self, cache_bytes=DEFAULT_CACHE_BYTES, frame_cache=None):
+        self.ax = self.fig.add_subplot(111)
+        self.dicom_data = None
+        self.frame_cache = frame_cache if frame_cache is not None else FrameCache(cache_bytes)
+        self.stack = None
+        self.slice_index = 0
+        self.image = None
+        self.raw_frame = None
+        self.pyramid = None  # for very large frames; see update_display
+        self.tile_key = None  # the pyramid region the image shows
+        self.rescale = (1.0, 0.0)
+        self.window = None
+        self.level = None
+        self.window_dirty = False
+        self.windowing = False
+        self.start_point = None
+        self.end_point = None
+        self.editing = None
+        self.edit_origin = None
+        self.tool = LINE
+        self.polygon_points = []
+        self.integral = None
+        self.measurement_store = None
+        self.persist_stats = True
+        self.instance_key = None
+        self.background = None
+        self.render_pending = False
+        self.full_render_pending = False
+        self.instrumentation = Instrumentation()
+        self.show_perf_overlay = False
+        self.cine = None
+        self.cine_fps = None  # None plays at the header's rate
+        self.cine_loop = True
+        self.cine_listener = None  # called with the CinePlayer when playback starts or stops
+        self.link = None  # ViewportLink of the layout, if any
+        self.following = False
+        self.follow_cleared = False
+        self.last_follow = 0.0
+
+        # Set dark mode colors if needed
+        if self.is_dark_mode():
+            self.fig.patch.set_facecolor('#2b2b2b')
+            self.ax.set_facecolor('#2b2b2b')
+            self.ax.tick_params(colors='white')
+            self.ax.xaxis.label.set_color('white')
+            self.ax.yaxis.label.set_color('white')
+            self.ax.spines['bottom'].set_color('white')
+            self.ax.spines['top'].set_color('white') 
+            self.ax.spines['right'].set_color('white')
+            self.ax.spines['left'].set_color('white')
+
+        self.mpl_connect("button_press_event", self.instrumented("mouse_press", self.on_mouse_press))
+        self.mpl_connect("motion_notify_event", self.instrumented("mouse_move", self.on_mouse_move))
+        self.mpl_connect("button_release_event", self.instrumented("mouse_release", self.on_mouse_release))
+        self.mpl_connect("scroll_event", self.instrumented("scroll", self.on_scroll))
+        self.mpl_connect("key_press_event", self.instrumented("key_press", self.on_key_press))
+        self.mpl_connect("draw_event", self.on_draw)
+
+        self.panning = False
+        self.last_event = None
+        
+        self.create_overlay_artists()
+        self.fig.tight_layout()
+
+    @property
+    def measurements(self):
+        return self.annotations.measurements
+
+    def create_overlay_artists(self):
+        # Persistent animated artists for the rubber-band measurement; they
+        # are excluded from full draws and blitted over a cached background.
+        self.annotations = AnnotationLayer(self.ax)
+        self.temp_line = Line2D([], [], color='r', linewidth=2, animated=True, visible=False)
+        self.ax.add_line(self.temp_line)
+        self.temp_text = self.ax.text(0, 0, "", color='yellow', fontsize=10, animated=True, visible=False,
+                                      bbox=dict(facecolor='black', alpha=0.5))
+        self.perf_text = self.ax.text(0.01, 0.99, "", transform=self.ax.transAxes, va='top', ha='left',
+                                      color='lime', fontsize=8, family='monospace', animated=True,
+                                      visible=self.show_perf_overlay, bbox=dict(facecolor='black', alpha=0.6))
+        self.cine_text = self.ax.text(0.01, 0.01, "", transform=self.ax.transAxes, va='bottom', ha='left',
+                                      color='white', fontsize=9, family='monospace', animated=True,
+                                      visible=False, bbox=dict(facecolor='black', alpha=0.6))
+
+    def instrumented(self, name, handler):
+        # Wraps an event handler in a timing span and starts the
+        # event-to-paint clock if the handler asked for a render
+        def wrapper(event):
+            instrumentation = self.instrumentation
+            if not instrumentation.enabled:
+                return handler(event)
+            start = time.perf_counter()
+            with instrumentation.span(name, "input"):
+                result = handler(event)
+            if self.render_pending:
+                instrumentation.mark_input(name, start)
+            return result
+        return wrapper
+
+    def toggle_perf_overlay(self):
+        self.show_perf_overlay = not self.show_perf_overlay
+        if self.show_perf_overlay:
+            self.instrumentation.enabled = True
+        self.perf_text.set_visible(self.show_perf_overlay)
+        self.request_render(full=True)
+
+    def draw(self):
+        # Also covers draws that don't go through request_render (toolbar,
+        # resizes), which may need other tiles
+        self.update_tiles()
+        with self.instrumentation.span("draw", "render"):
+            super().draw()
+        self.instrumentation.mark_paint()
+
+    def request_render(self, full=False):
+        self.full_render_pending = self.full_render_pending or full
+        if not self.render_pending:
+            self.render_pending = True
+            self.schedule(FRAME_INTERVAL_MS, self.flush_render)
+
+    def flush_render(self):
+        self.render_pending = False
+        if self.show_perf_overlay:
+            self.perf_text.set_text(self.instrumentation.summary())
+        if self.window_dirty:
+            self.update_display()
+        if self.full_render_pending or self.background is None:
+            self.full_render_pending = False
+            self.annotations.sync()
+            self.draw()
+        else:
+            self.blit_overlay()
+
+    def on_draw(self, event):
+        if self.is_saving():
+            # A savefig draw (report snapshot) is at another size and dpi;
+            # it mustn't become the background blits restore
+            self.background = None
+            return
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        self.draw_overlay_artists()
+
+    def snapshot_png(self):
+        # The figure as a PNG buffer for reports. Printing leaves the canvas's
+        # own buffer at the print size, so the view is drawn again after.
+        # Animated artists (the image during cine playback or a linked
+        # update) are left out of figure draws, so they are made still for it.
+        animated = [artist for artist in (self.image, self.ax.title) if artist is not None and artist.get_animated()]
+        for artist in animated:
+            artist.set_animated(False)
+        try:
+            image = render_figure_png(self.fig)
+        finally:
+            for artist in animated:
+                artist.set_animated(True)
+        self.request_render(full=True)
+        return image
+
+    def draw_overlay_artists(self):
+        # During cine playback and linked updates the image itself is animated
+        if self.image is not None and self.image.get_animated():
+            self.ax.draw_artist(self.image)
+        if self.ax.title.get_animated():
+            self.ax.draw_artist(self.ax.title)
+        for artist in (self.annotations.highlight, self.annotations.hover_label,
+                       self.temp_line, self.temp_text, self.perf_text, self.cine_text):
+            if artist.get_visible():
+                self.ax.draw_artist(artist)
+
+    def blit_overlay(self):
+        self.update_tiles()
+        with self.instrumentation.span("blit", "render"):
+            self.restore_region(self.background)
+            self.draw_overlay_artists()
+            self.blit(self.fig.bbox)
+        self.instrumentation.mark_paint()
+
+    def load_dicom(self, path):
+        # path may be a single file, a multi-frame file or a series folder
+        with self.instrumentation.span("load_dicom", "io"):
+            stack = DicomStack.from_path(path, self.frame_cache)
+        self.show_stack(stack)
+
+    def show_stack(self, stack):
+        self.stack = stack
+        self.following = False
+        self.ax.clear()
+        self.image = None
+        self.tile_key = None
+        self.window = None
+        self.instance_key = None
+        self.ax.axis("off")
+        self.create_overlay_artists()
+        self.show_slice(0)
+
+    def show_slice(self, index):
+        if self.stack is None:
+            return
+        if self.cine is not None:
+            self.stop_cine(refresh=False)
+        index = max(0, min(index, len(self.stack) - 1))
+        self.read_header(index)
+        # Frames stay in their stored dtype; rescale happens inside the LUT
+        with self.instrumentation.span("decode", "io"):
+            self.set_frame(self.stack.frame(index))
+        if self.window is None:
+            self.window, self.level = default_window(self.dicom_data, self.raw_frame, *self.rescale)
+
+        self.update_display()
+        self.update_title()
+        if self.current_instance() != self.instance_key:
+            self.load_measurements()
+        self.request_render(full=True)
+
+    def set_frame(self, frame):
+        # A new still frame. Very large ones are drawn from an image pyramid.
+        self.raw_frame = frame
+        self.integral = None
+        rows, columns = frame.shape[:2]
+        self.pyramid = ImagePyramid(frame) if rows * columns > PYRAMID_MIN_PIXELS else None
+
+    def read_header(self, index):
+        self.slice_index = index
+        self.dicom_data = self.stack.header(index)
+        self.rescale = (float(getattr(self.dicom_data, 'RescaleSlope', 1) or 1),
+                        float(getattr(self.dicom_data, 'RescaleIntercept', 0) or 0))
+
+    def start_cine(self):
+        if self.stack is None or len(self.stack) < 2 or self.cine is not None:
+            return False
+        self.cancel_drawing()
+        # Measurements belong to single frames, so they are hidden while playing
+        self.editing = None
+        self.annotations.set([])
+        self.instance_key = None
+        self.set_image_animated(True)
+        # Playback frames are already reduced to about screen size
+        self.pyramid = None
+        self.cine_text.set_visible(True)
+        self.cine = CinePlayer(self, self.cine_fps or cine_rate(self.dicom_data) or DEFAULT_CINE_FPS, self.cine_loop,
+                               self.display_factor())
+        self.update_title()
+        self.request_render(full=True)
+        self.cine.start((self.slice_index + 1) % len(self.stack))
+        if self.cine_listener is not None:
+            self.cine_listener(self.cine)
+        return True
+
+    def stop_cine(self, refresh=True):
+        player, self.cine = self.cine, None
+        if player is None:
+            return
+        player.stop()
+        self.set_image_animated(False)
+        self.cine_text.set_visible(False)
+        if refresh:
+            # Back to a still frame with its measurements
+            self.show_slice(self.slice_index)
+        if self.cine_listener is not None:
+            self.cine_listener(player)
+
+    def set_image_animated(self, animated):
+        # An animated image is drawn on every blit (cine playback, linked
+        # updates). It is resampled nearest-neighbour on the data, several
+        # times cheaper than the default smoothing; cine frames arrive at
+        # about screen size anyway (see display_factor), where the two look
+        # the same. The still image gets its smoothing back.
+        image = self.image
+        if image is None or image.get_animated() == animated:
+            return
+        if animated:
+            self.still_interpolation = (image.get_interpolation(), image.get_interpolation_stage())
+            image.set_interpolation('nearest')
+            image.set_interpolation_stage('data')
+        else:
+            image.set_interpolation(self.still_interpolation[0])
+            image.set_interpolation_stage(self.still_interpolation[1])
+        image.set_animated(animated)
+
+    def display_factor(self):
+        # Integer decimation that brings the visible part of the image down
+        # to about its on-screen size. Resampling a full-size frame is the
+        # most expensive part of drawing it; playback frames are reduced by
+        # this factor before they reach matplotlib. The image extent stays
+        # at full resolution, so coordinates don't change.
+        bbox = self.ax.get_window_extent()
+        (x0, x1), (y0, y1) = self.ax.get_xlim(), self.ax.get_ylim()
+        if bbox.width <= 0 or bbox.height <= 0:
+            return 1
+        return max(1, math.ceil(min(abs(x1 - x0) / bbox.width, abs(y1 - y0) / bbox.height)))
+
+    def toggle_cine(self):
+        if self.cine is not None:
+            self.stop_cine()
+        else:
+            self.start_cine()
+
+    def set_cine_fps(self, fps):
+        # fps None means the rate recommended by the header
+        self.cine_fps = fps
+        if self.cine is not None:
+            self.cine.set_fps(fps or cine_rate(self.dicom_data) or DEFAULT_CINE_FPS)
+            self.update_title()
+            self.request_render(full=True)
+
+    def show_cine_frame(self, index, frame):
+        # Playback path: new pixels go into the existing (animated) image
+        # artist and only the overlay layer is blitted, never a full draw
+        self.read_header(index)
+        self.raw_frame = frame
+        self.integral = None
+        self.update_display()
+        self.cine_text.set_text(f"Frame {index + 1}/{len(self.stack)}  {self.cine.actual_fps():5.1f} fps  "
+                                f"dropped {self.cine.dropped}")
+        if self.background is None:
+            self.request_render(full=True)
+        else:
+            self.blit_overlay()
+
+    def browse_to(self, index):
+        # Slice navigation by the user; linked viewports page by the same step
+        previous = self.slice_index
+        self.show_slice(index)
+        if self.slice_index != previous:
+            self.notify_link(LINK_SLICE, self.slice_index - previous)
+
+    def notify_link(self, kind, value=None):
+        if self.link is not None:
+            self.link.changed(self, kind, value)
+
+    def image_size(self):
+        # (rows, columns) at full resolution, even while cine shows reduced frames
+        rows, columns = self.raw_frame.shape[:2]
+        return int(getattr(self.dicom_data, 'Rows', rows)), int(getattr(self.dicom_data, 'Columns', columns))
+
+    def follow(self, clear_annotations=False):
+        # Start of an update pushed by a linked viewport. The first one of a
+        # burst animates the image and title and redraws once without them;
+        # the rest only blit. A full redraw follows when the burst stops.
+        self.last_follow = time.perf_counter()
+        if clear_annotations and not self.follow_cleared:
+            # Measurements belong to the slice shown before the burst
+            self.follow_cleared = True
+            self.cancel_drawing()
+            self.editing = None
+            self.annotations.set([])
+            self.instance_key = None
+            self.request_render(full=True)
+        if self.following:
+            return
+        self.following = True
+        self.set_image_animated(True)
+        self.ax.title.set_animated(True)
+        self.request_render(full=True)
+        self.schedule(LINK_SETTLE_MS, self.settle_follow)
+
+    def settle_follow(self):
+        if not self.following:
+            return
+        remaining = LINK_SETTLE_MS - (time.perf_counter() - self.last_follow) * 1000.0
+        if remaining > 0:
+            self.schedule(max(1, int(remaining)), self.settle_follow)
+            return
+        self.following = False
+        self.set_image_animated(self.cine is not None)
+        self.ax.title.set_animated(False)
+        if self.follow_cleared:
+            self.follow_cleared = False
+            self.show_slice(self.slice_index)  # brings its measurements back
+        else:
+            self.request_render(full=True)
+
+    def follow_view(self, source):
+        # Shows the same part of the image as source, in image-relative
+        # coordinates so that images of different sizes line up
+        rows, columns = source.image_size()
+        own_rows, own_columns = self.image_size()
+        (x0, x1), (y0, y1) = source.ax.get_xlim(), source.ax.get_ylim()
+        sx, sy = own_columns / columns, own_rows / rows
+        self.follow()
+        self.ax.set_xlim((x0 + 0.5) * sx - 0.5, (x1 + 0.5) * sx - 0.5)
+        self.ax.set_ylim((y0 + 0.5) * sy - 0.5, (y1 + 0.5) * sy - 0.5)
+        self.request_render()
+
+    def follow_window(self, window, level):
+        self.follow()
+        self.window = window
+        self.level = level
+        self.window_dirty = True
+        self.update_title()
+        self.request_render()
+
+    def follow_slice(self, step):
+        if self.cine is not None:
+            self.stop_cine(refresh=False)
+        index = max(0, min(self.slice_index + step, len(self.stack) - 1))
+        if index == self.slice_index:
+            return
+        self.follow(clear_annotations=True)
+        self.read_header(index)
+        with self.instrumentation.span("decode", "io"):
+            self.set_frame(self.stack.frame(index))
+        self.window_dirty = True
+        self.update_title()
+        self.request_render()
+
+    def current_instance(self):
+        # Measurements belong to a SOP instance (and frame, for multi-frame files)
+        path, frame = self.stack.slices[self.slice_index]
+        uid = getattr(self.dicom_data, 'SOPInstanceUID', None) or os.path.abspath(path)
+        return str(uid), frame
+
+    def load_measurements(self):
+        self.instance_key = self.current_instance()
+        self.editing = None
+        self.polygon_points = []
+        entries = []
+        if self.measurement_store is not None:
+            entries = self.measurement_store.entries(*self.instance_key)
+        if entries:
+            # Stats of every stored measurement are recomputed in one pass
+            # against the frame as loaded; those that changed (or were never
+            # computed) are written back together
+            spacing, unit = self.calibration()
+            results = measure_all(self.integral_image(), [m for _, m in entries], *self.rescale, spacing, unit)
+            changed = [(row_id, stats) for (row_id, m), stats in zip(entries, results) if m[8] != stats]
+            for (_, measurement), stats in zip(entries, results):
+                measurement[8] = stats
+            if changed and self.persist_stats:
+                self.measurement_store.update_stats(changed)
+        self.annotations.set(entries)
+
+    def calibration(self):
+        # (pixel spacing in mm or None, unit of the rescaled values)
+        return pixel_spacing(self.dicom_data), value_unit(self.dicom_data)
+
+    def integral_image(self):
+        if self.integral is None:
+            self.integral = IntegralImage(self.raw_frame)
+        return self.integral
+
+    def compute_stats(self, measurement, preview=False):
+        spacing, unit = self.calibration()
+        compute = preview_stats if preview else measure
+        measurement[8] = compute(self.integral_image(), measurement, *self.rescale, spacing, unit)
+        return measurement
+
+    def delete_selected_measurement(self):
+        key = self.annotations.selected
+        if key is None:
+            return
+        row_id, _ = self.annotations.remove(key)
+        if self.measurement_store is not None and row_id is not None:
+            self.measurement_store.delete(row_id)
+        self.request_render(full=True)
+
+    def update_display(self):
+        self.window_dirty = False
+        if self.raw_frame is None:
+            return
+        invert = getattr(self.dicom_data, 'PhotometricInterpretation', '') == 'MONOCHROME1'
+        frame, extent = self.raw_frame, None
+        if self.pyramid is not None:
+            if self.image is None:
+                # The region shown depends on the limits, so they come first
+                # and stay put when the image's extent changes
+                rows, columns = frame.shape[:2]
+                self.ax.set_autoscale_on(False)
+                self.ax.set_xlim(-0.5, columns - 0.5)
+                self.ax.set_ylim(rows - 0.5, -0.5)
+            bbox = self.ax.get_window_extent()
+            frame, extent, self.tile_key = self.pyramid.region(self.ax.get_xlim(), self.ax.get_ylim(),
+                                                               bbox.width, bbox.height)
+        elif self.tile_key is not None:
+            # Back from a pyramid region to the whole image
+            self.tile_key = None
+            rows, columns = self.image_size()
+            extent = (-0.5, columns - 0.5, rows - 0.5, -0.5)
+        with self.instrumentation.span("window_level", "render"):
+            display = apply_window(frame, *self.rescale, self.window, self.level, invert)
+        if self.image is None:
+            self.image = self.ax.imshow(display, cmap='gray', vmin=0, vmax=255, extent=extent)
+        else:
+            self.image.set_data(display)
+            if extent is not None:
+                self.image.set_extent(extent)
+
+    def update_tiles(self):
+        # Swaps in other tiles of the pyramid when a pan or zoom needs them
+        if self.pyramid is None or self.image is None:
+            return
+        bbox = self.ax.get_window_extent()
+        key = self.pyramid.region(self.ax.get_xlim(), self.ax.get_ylim(), bbox.width, bbox.height)[2]
+        if key != self.tile_key or self.window_dirty:
+            self.update_display()
+
+    def update_title(self):
+        title = TOOL_HINTS[self.tool]
+        if self.cine is not None:
+            title = f"Cine {self.cine.fps:.0f} fps - Space to pause"
+        elif len(self.stack) > 1:
+            title = f"Slice {self.slice_index + 1}/{len(self.stack)} - {title}"
+        title = f"{title}  [W {self.window:.0f} / L {self.level:.0f}]"
+        self.ax.set_title(title, color='white' if self.is_dark_mode() else 'black')
+        
+        # Update colors for dark mode
+        if self.is_dark_mode():
+            self.ax.title.set_color('white')
+
+    def set_window(self, window, level):
+        if self.raw_frame is None:
+            return
+        self.window = max(float(window), 1.0)
+        self.level = float(level)
+        # The LUT lookup is deferred to the next render so a burst of drag
+        # events costs a single indexing pass
+        self.window_dirty = True
+        self.update_title()
+        self.request_render(full=True)
+        self.notify_link(LINK_WINDOW)
+
+    def apply_window_preset(self, name):
+        if name in PRESETS:
+            self.set_window(*PRESETS[name])
+        elif self.raw_frame is not None:
+            self.set_window(*default_window(self.dicom_data, self.raw_frame, *self.rescale))
+
+    def on_key_press(self, event):
+        if event.key == PERF_OVERLAY_KEY:
+            self.toggle_perf_overlay()
+            return
+        if self.stack is None:
+            return
+        if event.key == CINE_KEY:
+            self.toggle_cine()
+            return
+        if event.key in ('delete', 'backspace'):
+            self.delete_selected_measurement()
+            return
+        if event.key == 'escape':
+            self.cancel_drawing()
+            return
+        if event.key == 'enter' and len(self.polygon_points) >= 3:
+            self.finish_polygon()
+            return
+        steps = {'down': 1, 'up': -1, 'pagedown': 10, 'pageup': -10}
+        if event.key in steps:
+            self.browse_to(self.slice_index + steps[event.key])
+        elif event.key == 'home':
+            self.browse_to(0)
+        elif event.key == 'end':
+            self.browse_to(len(self.stack) - 1)
+
+    def on_mouse_press(self, event):
+        if event.inaxes != self.ax:
+            return
+        if event.button == 3:  # Right click
+            self.panning = True
+            self.last_event = event
+            return
+        if event.button == 2:  # Middle click adjusts window/level
+            self.windowing = True
+            self.last_event = event
+            return
+        if event.button == 1:  # Left click
+            if self.cine is not None:
+                self.stop_cine()  # measure on a still frame
+            if self.polygon_points:
+                self.add_polygon_point(event)
+                return
+            # On an existing measurement: select it, and drag a handle (or
+            # the whole shape) to edit it. Elsewhere: start a new one.
+            hit = self.annotations.hit_test(event.xdata, event.ydata)
+            key = hit[0] if hit else None
+            if self.annotations.select(key):
+                self.request_render(full=True)
+            if hit:
+                self.annotations.set_hover(None)
+                self.editing = hit
+                self.edit_origin = (event.xdata, event.ydata)
+            elif self.tool == POLYGON:
+                self.add_polygon_point(event)
+            else:
+                self.start_point = (event.xdata, event.ydata)
+
+    def on_mouse_move(self, event):
+        if event.inaxes != self.ax:
+            return
+        if self.panning and self.last_event:
+            # Work in display pixels so pending (not yet drawn) limit
+            # changes don't skew the data coordinates of later events
+            inverse = self.ax.transData.inverted()
+            x0, y0 = inverse.transform((self.last_event.x, self.last_event.y))
+            x1, y1 = inverse.transform((event.x, event.y))
+            xlim = self.ax.get_xlim()
+            ylim = self.ax.get_ylim()
+            self.ax.set_xlim(xlim[0] - (x1 - x0), xlim[1] - (x1 - x0))
+            self.ax.set_ylim(ylim[0] - (y1 - y0), ylim[1] - (y1 - y0))
+            self.last_event = event
+            self.request_render(full=True)
+            self.notify_link(LINK_VIEW)
+            return
+        if self.windowing and self.last_event:
+            # Horizontal drag changes the width, vertical drag the level
+            step = self.window / 200.0
+            self.set_window(self.window + (event.x - self.last_event.x) * step,
+                            self.level + (event.y - self.last_event.y) * step)
+            self.last_event = event
+            return
+        if self.editing is not None:
+            measurement = self.edited_measurement(event)
+        elif self.start_point is not None:
+            self.end_point = (event.xdata, event.ydata)
+            measurement = self.drawn_measurement()
+        elif self.polygon_points:
+            self.show_preview(self.polygon_points + [(event.xdata, event.ydata)], False)
+            return
+        else:
+            # Hover highlighting only needs a blit
+            hit = self.annotations.hit_test(event.xdata, event.ydata)
+            if self.annotations.set_hover(hit[0] if hit else None):
+                self.request_render()
+            return
+
+        # Rectangle stats while dragging are summed-area lookups
+        self.compute_stats(measurement, preview=True)
+        self.show_preview(*outline(measurement), describe(measurement))
+
+    def show_preview(self, vertices, closed, text=None):
+        xs, ys = zip(*(vertices + vertices[:1] if closed else vertices))
+        self.temp_line.set_data(xs, ys)
+        self.temp_line.set_visible(True)
+        if text is not None:
+            xs, ys = zip(*vertices)
+            self.temp_text.set_position(((min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2))
+            self.temp_text.set_text(text)
+        self.temp_text.set_visible(text is not None)
+        self.request_render()
+
+    def cancel_drawing(self):
+        self.start_point = None
+        self.end_point = None
+        self.polygon_points = []
+        self.temp_line.set_visible(False)
+        self.temp_text.set_visible(False)
+        self.request_render()
+
+    def set_tool(self, tool):
+        self.tool = tool
+        self.cancel_drawing()
+        if self.stack is not None:
+            self.update_title()
+            self.request_render(full=True)
+
+    def drawn_measurement(self):
+        x0, y0 = self.start_point
+        x1, y1 = self.end_point
+        length = math.hypot(x1 - x0, y1 - y0) if self.tool == LINE else None
+        return [None, x0, y0, x1, y1, length, self.tool, None, None]
+
+    def add_polygon_point(self, event):
+        point = (event.xdata, event.ydata)
+        points = self.polygon_points
+        # A double-click, or a click back on the first vertex, closes it
+        if len(points) >= 3 and (event.dblclick or
+                                 math.hypot(point[0] - points[0][0], point[1] - points[0][1]) <= self.annotations.pick_radius()):
+            self.finish_polygon()
+            return
+        if not event.dblclick:
+            points.append(point)
+        self.show_preview(points, False)
+
+    def finish_polygon(self):
+        points = self.polygon_points
+        self.polygon_points = []
+        xs, ys = zip(*points)
+        self.add_measurement([None, min(xs), min(ys), max(xs), max(ys), None, POLYGON, points, None])
+
+    def edited_measurement(self, event):
+        key, part = self.editing
+        dx = event.xdata - self.edit_origin[0]
+        dy = event.ydata - self.edit_origin[1]
+        return moved(self.annotations.measurement(key), part, event.xdata, event.ydata, dx, dy)
+
+    def finish_edit(self, event):
+        key = self.editing[0]
+        self.temp_line.set_visible(False)
+        self.temp_text.set_visible(False)
+        if event.inaxes != self.ax or (event.xdata, event.ydata) == self.edit_origin:
+            self.editing = None
+            self.request_render()
+            return  # a plain click only selects
+        measurement = self.compute_stats(self.edited_measurement(event))
+        self.editing = None
+        self.annotations.update(key, measurement)
+        row_id = self.annotations.row_id(key)
+        if self.measurement_store is not None and row_id is not None:
+            self.measurement_store.update(row_id, measurement)
+        self.request_render(full=True)
+
+    def on_mouse_release(self, event):
+        if self.panning or self.windowing:
+            self.panning = False
+            self.windowing = False
+            self.last_event = None
+            return
+        if self.editing is not None:
+            self.finish_edit(event)
+            return
+        if event.inaxes != self.ax or self.start_point is None:
+            return
+
+        self.end_point = (event.xdata, event.ydata)
+        measurement = self.drawn_measurement()
+        self.start_point = None
+        self.end_point = None
+        if measurement[6] != LINE and (measurement[1] == measurement[3] or measurement[2] == measurement[4]):
+            self.cancel_drawing()  # a click without a drag draws no ROI
+            return
+        self.add_measurement(measurement)
+
+    def add_measurement(self, measurement):
+        self.temp_line.set_visible(False)
+        self.temp_text.set_visible(False)
+
+        name = self.ask_measurement_name()
+        if not name or not name.strip():
+            name = f"Measurement {len(self.annotations)+1}"
+        measurement[0] = name
+        self.compute_stats(measurement)
+
+        row_id = None
+        if self.measurement_store is not None and self.instance_key is not None:
+            row_id = self.measurement_store.add(self.instance_key[0], measurement, self.instance_key[1])
+        self.annotations.add(measurement, row_id)
+        self.request_render(full=True)
+
+    def on_scroll(self, event):
+        # Shift + scroll steps through the slices of a stack
+        if event.key == 'shift' and self.stack is not None and len(self.stack) > 1:
+            self.browse_to(self.slice_index + (-1 if event.button == 'up' else 1))
+            return
+
+        base_scale = 1.1
+        scale_factor = 1 / base_scale if event.button == 'up' else base_scale
+
+        xlim = self.ax.get_xlim()
+        ylim = self.ax.get_ylim()
+        xdata = event.xdata
+        ydata = event.ydata
+        
+        if xdata is not None and ydata is not None:
+            new_xlim = [xdata - (xdata - xlim[0]) * scale_factor, xdata + (xlim[1] - xdata) * scale_factor]
+            new_ylim = [ydata - (ydata - ylim[0]) * scale_factor, ydata + (ylim[1] - ydata) * scale_factor]
+            self.ax.set_xlim(new_xlim)
+            self.ax.set_ylim(new_ylim)
+            self.request_render(full=True)
+            self.notify_link(LINK_VIEW)
+
+
+class DicomCanvas(DicomCanvasMixin, FigureCanvasTkAgg):
+    def __init__(self, parent, cache_bytes=DEFAULT_CACHE_BYTES, frame_cache=None):
+        self.fig = Figure(figsize=(6, 5), dpi=100, facecolor='#2b2b2b' if ctk.get_appearance_mode() == "Dark" else '#f0f0f0')
+        FigureCanvasTkAgg.__init__(self, self.fig, master=parent)
+        self.init_viewer(cache_bytes, frame_cache)
+        self.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    def is_dark_mode(self):
+        return ctk.get_appearance_mode() == "Dark"
+
+    def schedule(self, delay, callback):
+        return self.get_tk_widget().after(delay, callback)
+
+    def ask_measurement_name(self):
+        # Modern dialog with CTk
+        dialog = ctk.CTkInputDialog(text="Enter name for this measurement:", title="Name this marking")
+        return dialog.get_input()
+
+
+class HeadlessDicomCanvas(DicomCanvasMixin, FigureCanvasAgg):
+    # Renders through Agg without a display or event loop (batch jobs,
+    # benchmarks). With defer=True scheduled callbacks wait for
+    # run_pending() instead of running immediately. Either way, one
+    # scheduled from inside another (a cine tick, a linked view settling)
+    # waits for run_pending(), since those reschedule themselves.
+    def __init__(self, cache_bytes=DEFAULT_CACHE_BYTES, figsize=(6, 5), dpi=100, defer=False, frame_cache=None):
+        self.fig = Figure(figsize=figsize, dpi=dpi, facecolor='#f0f0f0')
+        self.defer = defer
+        self.pending = []
+        self.running = False
+        FigureCanvasAgg.__init__(self, self.fig)
+        self.init_viewer(cache_bytes, frame_cache)
+
+    def is_dark_mode(self):
+        return False
+
+    def schedule(self, delay, callback):
+        if self.defer or self.running:
+            self.pending.append(callback)
+        else:
+            self.run_callbacks([callback])
+
+    def run_pending(self):
+        pending, self.pending = self.pending, []
+        self.run_callbacks(pending)
+
+    def run_callbacks(self, callbacks):
+        running, self.running = self.running, True
+        try:
+            for callback in callbacks:
+                callback()
+        finally:
+            self.running = running
+
+    def ask_measurement_name(self):
+        return None
@@ -0,0 +1,396 @@
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pydicom
+from pydicom.uid import ExplicitVRBigEndian, ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+try:
+    # pydicom >= 3 can decode a single frame straight from the file
+    from pydicom.pixels import pixel_array as decode_pixels
+except ImportError:
+    decode_pixels = None
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+DEFAULT_DISK_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".dicom_viewer", "frame_cache")
+DEFAULT_DISK_CACHE_BYTES = 4 * 1024 * 1024 * 1024
+# Memory maps a stack keeps open at once. Each holds a file descriptor, so
+# a series of single-frame files is mapped a few slices at a time.
+MAX_OPEN_MAPS = 32
+
+# Uncompressed transfer syntaxes whose pixel data can be mapped straight
+# from the file: uid -> (implicit VR, byte order)
+NATIVE_TRANSFER_SYNTAXES = {
+    ImplicitVRLittleEndian: (True, '<'),
+    ExplicitVRLittleEndian: (False, '<'),
+    ExplicitVRBigEndian: (False, '>'),
+}
+# Explicit VRs that use a 4-byte length after two reserved bytes
+LONG_LENGTH_VRS = {b'OB', b'OD', b'OF', b'OL', b'OV', b'OW', b'UN'}
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class FrameCache:
+    # LRU cache of decoded frames bounded by a memory budget in bytes,
+    # optionally backed by a DiskFrameCache for compressed images
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, disk=None):
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key, frame):
+        nbytes = frame.nbytes
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._frames[key] = frame
+            self.current_bytes += nbytes
+            self._evict()
+
+    def set_budget(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.current_bytes = 0
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._frames:
+            _, frame = self._frames.popitem(last=False)
+            self.current_bytes -= frame.nbytes
+
+
+class DiskFrameCache:
+    # Decoded frames of compressed images saved as .npy files, keyed by
+    # SOPInstanceUID + frame + transfer syntax and evicted least recently
+    # used first once the directory grows past max_bytes. Hits are
+    # memory-mapped rather than read.
+    def __init__(self, directory=DEFAULT_DISK_CACHE_DIR, max_bytes=DEFAULT_DISK_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Rebuild the LRU order from modification times (touched on every hit)
+        entries = []
+        for name in os.listdir(directory):
+            if not name.endswith('.npy'):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.current_bytes = sum(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _name(self, uid, frame, transfer_syntax):
+        key = f"{uid}|{-1 if frame is None else frame}|{transfer_syntax}"
+        return hashlib.sha1(key.encode()).hexdigest() + '.npy'
+
+    def get(self, uid, frame, transfer_syntax):
+        name = self._name(uid, frame, transfer_syntax)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                array = np.load(path, mmap_mode='r')
+                os.utime(path)
+            except (OSError, ValueError):
+                self.current_bytes -= self._entries.pop(name)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return array
+
+    def put(self, uid, frame, transfer_syntax, array):
+        name = self._name(uid, frame, transfer_syntax)
+        path = os.path.join(self.directory, name)
+        # Write to a temporary file first so a crash never leaves a torn entry
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as file:
+                np.save(file, np.ascontiguousarray(array))
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self._lock:
+            self.current_bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self.current_bytes -= old_size
+                try:
+                    os.remove(os.path.join(self.directory, old_name))
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            for name in self._entries:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+def map_native_frames(path):
+    # Returns a read-only np.memmap of shape (frames, rows, columns[, samples])
+    # over the PixelData of an uncompressed file, or None if the file can't
+    # be mapped. Nothing beyond the header is read until frames are used.
+    layout = native_layout(path)
+    if layout is None:
+        return None
+    offset, dtype, shape = layout
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def native_layout(path):
+    # (offset, dtype, shape) of the PixelData of an uncompressed file, or
+    # None if it can't be mapped
+    with open(path, 'rb') as fp:
+        ds = pydicom.dcmread(fp, stop_before_pixels=True)
+        file_meta = getattr(ds, 'file_meta', None)
+        syntax = NATIVE_TRANSFER_SYNTAXES.get(getattr(file_meta, 'TransferSyntaxUID', None))
+        if syntax is None or 'Rows' not in ds:
+            return None
+        implicit, endian = syntax
+
+        bits = ds.get('BitsAllocated')
+        signed = ds.get('PixelRepresentation', 0) == 1
+        samples = ds.get('SamplesPerPixel', 1)
+        if bits not in (8, 16, 32) or (signed and ds.get('BitsStored', bits) != bits):
+            return None  # packed or sign-extended data needs pydicom's decoder
+        if samples > 1 and ds.get('PlanarConfiguration', 0) != 0:
+            return None
+
+        # dcmread left the file positioned at the PixelData element header
+        header = fp.read(8)
+        if len(header) < 8 or struct.unpack(endian + 'HH', header[:4]) != (0x7FE0, 0x0010):
+            return None
+        if implicit:
+            length = struct.unpack(endian + 'I', header[4:8])[0]
+        elif header[4:6] in LONG_LENGTH_VRS:
+            length = struct.unpack(endian + 'I', fp.read(4))[0]
+        else:
+            length = struct.unpack(endian + 'H', header[6:8])[0]
+        offset = fp.tell()
+
+    frames = int(ds.get('NumberOfFrames', 1) or 1)
+    shape = (frames, ds.Rows, ds.Columns) + ((samples,) if samples > 1 else ())
+    dtype = np.dtype(f"{endian}{'i' if signed else 'u'}{bits // 8}")
+    if length == 0xFFFFFFFF or length < int(np.prod(shape)) * dtype.itemsize:
+        return None
+    return offset, dtype, shape
+
+
+def _frame_count(ds):
+    return int(getattr(ds, 'NumberOfFrames', 1) or 1)
+
+
+def _slice_sort_key(item):
+    path, ds = item
+    position = getattr(ds, 'ImagePositionPatient', None)
+    orientation = getattr(ds, 'ImageOrientationPatient', None)
+    if position is not None and orientation is not None and len(orientation) == 6:
+        row = np.array(orientation[:3], dtype=float)
+        col = np.array(orientation[3:], dtype=float)
+        distance = float(np.dot(np.cross(row, col), np.array(position, dtype=float)))
+        return (0, distance, path)
+    number = getattr(ds, 'InstanceNumber', None)
+    return (1, float(number) if number is not None else 0.0, path)
+
+
+class DicomStack:
+    # An ordered list of slices; each slice is (path, frame index or None)
+    # and its pixels are only decoded when requested. Uncompressed files are
+    # memory-mapped instead of decoded (set memmap to False to disable).
+    def __init__(self, slices, headers, cache=None, memmap=True):
+        self.slices = slices
+        self.headers = headers
+        self.cache = cache if cache is not None else FrameCache()
+        self.memmap = memmap
+        self._layouts = {}  # path -> native_layout(path)
+        self._mapped = OrderedDict()  # path -> open np.memmap, least recently used first
+
+    def __len__(self):
+        return len(self.slices)
+
+    @classmethod
+    def from_path(cls, path, cache=None, progress=None, cancel=None):
+        # progress(done, total) is called as headers are read; setting the
+        # cancel event aborts the scan with LoadCancelled
+        if os.path.isdir(path):
+            return cls.from_directory(path, cache, progress, cancel)
+        stack = cls.from_file(path, cache)
+        if progress is not None:
+            progress(1, 1)
+        return stack
+
+    @classmethod
+    def from_file(cls, path, cache=None):
+        ds = pydicom.dcmread(path, stop_before_pixels=True)
+        frames = _frame_count(ds)
+        if frames > 1:
+            return cls([(path, i) for i in range(frames)], [ds] * frames, cache)
+        return cls([(path, None)], [ds], cache)
+
+    @classmethod
+    def from_directory(cls, folder, cache=None, progress=None, cancel=None):
+        paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))]
+        paths = [path for path in paths if os.path.isfile(path)]
+        return cls.from_files(paths, cache, progress, cancel, folder)
+
+    @classmethod
+    def from_files(cls, paths, cache=None, progress=None, cancel=None, label="selection"):
+        series = {}
+        for done, path in enumerate(paths, 1):
+            if cancel is not None and cancel.is_set():
+                raise LoadCancelled(label)
+            if progress is not None:
+                progress(done, len(paths))
+            try:
+                ds = pydicom.dcmread(path, stop_before_pixels=True)
+            except Exception:
+                continue
+            if 'Rows' not in ds:
+                continue
+            series.setdefault(getattr(ds, 'SeriesInstanceUID', ''), []).append((path, ds))
+        if not series:
+            raise ValueError(f"No DICOM images found in {label}")
+
+        # The files may hold several series; browse the largest one
+        items = sorted(max(series.values(), key=lambda items: sum(_frame_count(ds) for _, ds in items)),
+                       key=_slice_sort_key)
+        if len(items) == 1:
+            return cls.from_file(items[0][0], cache)
+        # A series of multi-frame files (ultrasound clips, XA runs) is
+        # browsed frame by frame, file after file
+        slices = []
+        headers = []
+        for path, ds in items:
+            frames = _frame_count(ds)
+            if frames > 1:
+                slices += [(path, i) for i in range(frames)]
+                headers += [ds] * frames
+            else:
+                slices.append((path, None))
+                headers.append(ds)
+        return cls(slices, headers, cache)
+
+    def header(self, index):
+        return self.headers[index]
+
+    def frame(self, index):
+        key = self.slices[index]
+        frames = self.mapped_frames(key[0])
+        if frames is not None:
+            # Served from the OS page cache, so not counted in the frame cache
+            return frames[key[1] or 0]
+        frame = self.cache.get(key)
+        if frame is None:
+            frame = self._decode_cached(index, *key)
+            self.cache.put(key, frame)
+        return frame
+
+    def _decode_cached(self, index, path, frame_index):
+        # Compressed frames go through the on-disk cache when there is one
+        disk = self.cache.disk
+        ds = self.headers[index]
+        uid = getattr(ds, 'SOPInstanceUID', None)
+        transfer_syntax = getattr(getattr(ds, 'file_meta', None), 'TransferSyntaxUID', None)
+        if disk is None or not uid or transfer_syntax is None or not transfer_syntax.is_compressed:
+            return self._decode(path, frame_index)
+
+        frame = disk.get(uid, frame_index, transfer_syntax)
+        if frame is None:
+            frame = self._decode(path, frame_index)
+            disk.put(uid, frame_index, transfer_syntax, frame)
+        return frame
+
+    def mapped_frames(self, path):
+        if not self.memmap:
+            return None
+        frames = self._mapped.get(path)
+        if frames is not None:
+            self._mapped.move_to_end(path)
+            return frames
+        # The header is parsed once per file; the map itself is reopened
+        # when the file comes back after being evicted
+        if path not in self._layouts:
+            try:
+                self._layouts[path] = native_layout(path)
+            except Exception:
+                self._layouts[path] = None
+        layout = self._layouts[path]
+        if layout is None:
+            return None
+        offset, dtype, shape = layout
+        try:
+            frames = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        except OSError:
+            return None  # e.g. out of file descriptors; decoded instead
+        self._mapped[path] = frames
+        if len(self._mapped) > MAX_OPEN_MAPS:
+            # Closed once nothing else (the frame on screen) refers to it
+            self._mapped.popitem(last=False)
+        return frames
+
+    def _decode(self, path, frame_index):
+        if frame_index is None:
+            if decode_pixels is not None:
+                return decode_pixels(path)
+            return pydicom.dcmread(path).pixel_array
+        if decode_pixels is not None:
+            return decode_pixels(path, index=frame_index)
+        # Older pydicom can only decode every frame at once. The other frames
+        # go into the frame cache as copies, so the budget holds and the full
+        # array is freed.
+        frames = pydicom.dcmread(path).pixel_array
+        for i in range(len(frames)):
+            if i != frame_index:
+                self.cache.put((path, i), frames[i].copy())
+        return frames[frame_index].copy()
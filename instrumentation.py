@@ -0,0 +1,146 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Setting this to a file path enables instrumentation at startup and
+# writes the trace there on exit
+TRACE_ENV_VAR = "DICOM_VIEWER_TRACE"
+
+# Upper bounds (ms) of the event-to-paint latency histogram buckets
+LATENCY_BUCKETS_MS = [1, 2, 4, 8, 16, 33, 50, 100, 200, 500, 1000, float("inf")]
+MAX_TRACE_EVENTS = 200000
+MAX_LATENCY_SAMPLES = 1024
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, owner, name, category):
+        self.owner = owner
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.owner.add_event(self.name, self.category, self.start, time.perf_counter())
+        return False
+
+
+class Instrumentation:
+    # Timing spans, event-to-paint latency histograms and a frame counter.
+    # When disabled every hook returns straight away.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.events = deque(maxlen=MAX_TRACE_EVENTS)
+        self.histograms = {}
+        self.latencies = {}
+        self.paint_times = deque(maxlen=240)
+        self.pending_input = None
+        self._lock = threading.Lock()
+
+    def span(self, name, category="viewer"):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, category)
+
+    def add_event(self, name, category, start, end):
+        with self._lock:
+            self.events.append((name, category, start, end, threading.get_ident()))
+
+    def mark_input(self, name, start):
+        # Called by an input handler that requested a render; the first
+        # input since the last paint is what the paint's latency is measured from
+        if self.enabled and self.pending_input is None:
+            self.pending_input = (name, start)
+
+    def mark_paint(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.paint_times.append(now)
+        if self.pending_input is None:
+            return
+        name, start = self.pending_input
+        self.pending_input = None
+        latency_ms = (now - start) * 1000.0
+        with self._lock:
+            counts = self.histograms.setdefault(name, [0] * len(LATENCY_BUCKETS_MS))
+            counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            self.latencies.setdefault(name, deque(maxlen=MAX_LATENCY_SAMPLES)).append(latency_ms)
+
+    def fps(self):
+        now = time.perf_counter()
+        return sum(1 for t in self.paint_times if now - t <= 1.0)
+
+    def summary(self):
+        lines = [f"FPS {self.fps()}"]
+        with self._lock:
+            for name, samples in sorted(self.latencies.items()):
+                ordered = sorted(samples)
+                p50 = ordered[len(ordered) // 2]
+                p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+                lines.append(f"{name}: p50 {p50:.1f} ms  p95 {p95:.1f} ms")
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        # Chrome trace-event format (load in chrome://tracing or Perfetto)
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {"name": name, "cat": category, "ph": "X", "pid": pid, "tid": tid,
+                 "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6}
+                for name, category, start, end, tid in self.events
+            ]
+            histograms = {
+                name: dict(zip([str(bound) for bound in LATENCY_BUCKETS_MS], counts))
+                for name, counts in self.histograms.items()
+            }
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"latency_histograms_ms": histograms}}, file)
+        return len(events)
+
+
+class StartupTimer:
+    # Named checkpoints from process start (or any origin) to the first
+    # window and beyond; each phase is the time since the previous mark
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def elapsed_ms(self, name=None):
+        for mark, when in reversed(self.marks):
+            if name is None or mark == name:
+                return (when - self.origin) * 1000.0
+        return None
+
+    def breakdown(self):
+        # [(phase, phase ms, cumulative ms)]
+        rows = []
+        previous = self.origin
+        for name, when in self.marks:
+            rows.append((name, (when - previous) * 1000.0, (when - self.origin) * 1000.0))
+            previous = when
+        return rows
+
+    def report(self):
+        return "\n".join(f"{name:<16} {phase:8.1f} ms  {total:8.1f} ms" for name, phase, total in self.breakdown())
@@ -0,0 +1,188 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".dicom_viewer", "measurements.db")
+CSV_HEADER = ["Name", "Start X", "Start Y", "End X", "End Y", "Length (px)", "Kind", "Length (mm)",
+              "Area", "Area Unit", "Mean", "Std", "Min", "Max", "Unit", "Points"]
+
+# Pending inserts are committed (and synced) in batches rather than one by one
+COMMIT_BATCH_SIZE = 50
+COMMIT_INTERVAL = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sop_instance_uid TEXT NOT NULL,
+    frame INTEGER NOT NULL DEFAULT -1,
+    name TEXT NOT NULL,
+    x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+    length REAL,
+    created REAL,
+    kind TEXT NOT NULL DEFAULT 'line',
+    points TEXT,
+    stats TEXT
+);
+CREATE INDEX IF NOT EXISTS measurements_instance ON measurements (sop_instance_uid, frame);
+"""
+
+# Columns added after the first release; older databases get them on open
+MIGRATIONS = [
+    ("kind", "ALTER TABLE measurements ADD COLUMN kind TEXT NOT NULL DEFAULT 'line'"),
+    ("points", "ALTER TABLE measurements ADD COLUMN points TEXT"),
+    ("stats", "ALTER TABLE measurements ADD COLUMN stats TEXT"),
+]
+
+SELECT_COLUMNS = "name, x0, y0, x1, y1, length, kind, points, stats"
+
+
+def _record(measurement):
+    # [name, x0, y0, x1, y1, length, kind, points, stats] -> column values;
+    # 6-field measurements are lines without stats
+    name, x0, y0, x1, y1, length, kind, points, stats = list(measurement) + ["line", None, None][len(measurement) - 6:]
+    return (name, x0, y0, x1, y1, length, kind,
+            None if points is None else json.dumps([list(map(float, point)) for point in points]),
+            None if stats is None else json.dumps(stats))
+
+
+def _measurement(row):
+    name, x0, y0, x1, y1, length, kind, points, stats = row
+    return [name, x0, y0, x1, y1, length, kind,
+            None if points is None else [tuple(point) for point in json.loads(points)],
+            None if stats is None else json.loads(stats)]
+
+
+def _csv_row(row):
+    name, x0, y0, x1, y1, length, kind, points, stats = _measurement(row)
+    stats = stats or {}
+    return [name, x0, y0, x1, y1, length, kind, stats.get("length_mm"), stats.get("area"), stats.get("area_unit"),
+            stats.get("mean"), stats.get("std"), stats.get("min"), stats.get("max"), stats.get("unit"),
+            "" if points is None else " ".join(f"{x:.1f},{y:.1f}" for x, y in points)]
+
+
+class MeasurementStore:
+    # Measurements keyed by SOPInstanceUID (and frame for multi-frame
+    # images), kept in an SQLite database in WAL mode. Adding one is a
+    # single insert; commits are batched.
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(measurements)")}
+        for column, statement in MIGRATIONS:
+            if column not in columns:
+                self.conn.execute(statement)
+        self.conn.commit()
+        self.pending = 0
+        self.last_commit = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, uid, measurement, frame=None):
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO measurements (sop_instance_uid, frame, created, name, x0, y0, x1, y1, length, kind, points, stats) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (uid, -1 if frame is None else frame, time.time()) + _record(measurement)
+            )
+            self._changed()
+            return cursor.lastrowid
+
+    def update(self, row_id, measurement):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE measurements SET name = ?, x0 = ?, y0 = ?, x1 = ?, y1 = ?, length = ?, "
+                "kind = ?, points = ?, stats = ? WHERE id = ?",
+                _record(measurement) + (row_id,)
+            )
+            self._changed()
+
+    def update_stats(self, stats_by_id):
+        # [(row id, stats)] written in one statement
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE measurements SET stats = ? WHERE id = ?",
+                [(json.dumps(stats), row_id) for row_id, stats in stats_by_id]
+            )
+            self._changed()
+
+    def delete(self, row_id):
+        with self._lock:
+            self.conn.execute("DELETE FROM measurements WHERE id = ?", (row_id,))
+            self._changed()
+
+    def for_instance(self, uid, frame=None):
+        return [measurement for _, measurement in self.entries(uid, frame)]
+
+    def entries(self, uid, frame=None):
+        # (row id, measurement) pairs; the id is what update/delete take
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, {SELECT_COLUMNS} FROM measurements "
+                "WHERE sop_instance_uid = ? AND frame = ? ORDER BY id",
+                (uid, -1 if frame is None else frame)
+            ).fetchall()
+        return [(row[0], _measurement(row[1:])) for row in rows]
+
+    def frames(self, uid):
+        # Frames of an instance that have measurements; None stands for a
+        # single-frame image
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT frame FROM measurements WHERE sop_instance_uid = ? ORDER BY frame", (uid,)
+            ).fetchall()
+        return [None if frame == -1 else frame for frame, in rows]
+
+    def iter_rows(self, uid=None, frame=None):
+        # Streams CSV rows straight from the database cursor
+        query = f"SELECT {SELECT_COLUMNS} FROM measurements"
+        params = ()
+        if uid is not None:
+            query += " WHERE sop_instance_uid = ? AND frame = ?"
+            params = (uid, -1 if frame is None else frame)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(query + " ORDER BY id", params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for row in rows:
+                yield _csv_row(row)
+
+    def export_csv(self, path, uid=None, frame=None):
+        count = 0
+        with open(path, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_HEADER)
+            for row in self.iter_rows(uid, frame):
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def flush(self):
+        with self._lock:
+            if self.pending:
+                self._commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
+
+    def _changed(self):
+        self.pending += 1
+        if self.pending >= COMMIT_BATCH_SIZE or time.monotonic() - self.last_commit >= COMMIT_INTERVAL:
+            self._commit()
+
+    def _commit(self):
+        self.conn.commit()
+        self.pending = 0
+        self.last_commit = time.monotonic()
@@ -0,0 +1,242 @@
+import math
+
+import numpy as np
+from matplotlib.lines import Line2D
+
+from dicom_canvas import DicomCanvas, HeadlessDicomCanvas
+from volume import AXIAL, CORONAL, SAGITTAL
+
+CROSSHAIR_COLOR = 'orange'
+
+
+class MprController:
+    # Keeps the axial, coronal and sagittal views of one Volume on a shared
+    # crosshair (slice, row, column) and window/level. Only the views whose
+    # plane actually changes are redrawn; the others just blit their
+    # crosshair. A non-zero angle turns the sagittal view into an oblique
+    # plane rotated about the slice axis.
+    def __init__(self, volume, views, window, level):
+        self.volume = volume
+        self.views = views  # orientation -> MprViewMixin canvas
+        n, rows, columns = volume.shape
+        self.position = [(n - 1) / 2, (rows - 1) / 2, (columns - 1) / 2]
+        self.angle = 0.0
+        self.oblique = None  # (base, direction, width) of the oblique plane
+        self.shown = {}
+        for orientation, view in views.items():
+            view.attach(self, orientation, window, level)
+        self.refresh()
+
+    def plane_index(self, orientation):
+        k, r, c = self.position
+        n, rows, columns = self.volume.shape
+        if orientation == AXIAL:
+            return min(max(int(round(k)), 0), n - 1)
+        if orientation == CORONAL:
+            return min(max(int(round(r)), 0), rows - 1)
+        return min(max(int(round(c)), 0), columns - 1)
+
+    def plane_key(self, orientation):
+        if orientation == SAGITTAL and self.angle:
+            # The oblique plane only moves with the crosshair's offset
+            # across it, not along it
+            k, r, c = self.position
+            return self.angle, round(c * math.cos(self.angle) - r * math.sin(self.angle), 3)
+        return self.plane_index(orientation)
+
+    def plane_image(self, orientation):
+        # (image, aspect) of the current plane of a view
+        volume = self.volume
+        if orientation == SAGITTAL and self.angle:
+            k, r, c = self.position
+            image, base, direction = volume.oblique(r, c, self.angle)
+            self.oblique = (base, direction, image.shape[1])
+            slice_mm, row_mm, column_mm = volume.spacing
+            return image, slice_mm / math.hypot(direction[0] * row_mm, direction[1] * column_mm)
+        return volume.plane(orientation, self.plane_index(orientation)), volume.aspect(orientation)
+
+    def crosshair(self, orientation):
+        # Two lines, each as ((x0, x1), (y0, y1)) in the view's data coordinates
+        k, r, c = self.position
+        n, rows, columns = self.volume.shape
+        reach = rows + columns + n
+        if orientation == AXIAL:
+            # The sagittal / oblique plane runs along (row, column) direction
+            # (cos angle, sin angle), i.e. (sin, cos) in (x, y)
+            dx, dy = math.sin(self.angle), math.cos(self.angle)
+            return [((-reach, reach), (r, r)),
+                    ((c - reach * dx, c + reach * dx), (r - reach * dy, r + reach * dy))]
+        if orientation == CORONAL:
+            return [((-reach, reach), (k, k)), ((c, c), (-reach, reach))]
+        if self.angle:
+            base, direction, width = self.oblique
+            x = float(np.dot(np.array([r, c]) - base, direction)) + width / 2
+        else:
+            x = r
+        return [((-reach, reach), (k, k)), ((x, x), (-reach, reach))]
+
+    def refresh(self):
+        for orientation, view in self.views.items():
+            key = self.plane_key(orientation)
+            if self.shown.get(orientation) != key:
+                self.shown[orientation] = key
+                image, aspect = self.plane_image(orientation)
+                view.show_plane(image, aspect)
+            view.set_crosshair(self.crosshair(orientation))
+
+    def move_to(self, orientation, x, y):
+        # Moves the crosshair to a point clicked in one of the views
+        n, rows, columns = self.volume.shape
+        k, r, c = self.position
+        if orientation == AXIAL:
+            r, c = y, x
+        elif orientation == CORONAL:
+            c, k = x, y
+        elif self.angle:
+            base, direction, width = self.oblique
+            r, c = base + (x - width / 2) * direction
+            k = y
+        else:
+            r, k = x, y
+        self.position = [min(max(k, 0), n - 1), min(max(r, 0), rows - 1), min(max(c, 0), columns - 1)]
+        self.refresh()
+
+    def step(self, orientation, amount):
+        # Pages a view through its planes (the oblique one along its normal)
+        n, rows, columns = self.volume.shape
+        k, r, c = self.position
+        if orientation == AXIAL:
+            k = round(k) + amount
+        elif orientation == CORONAL:
+            r = round(r) + amount
+        elif self.angle:
+            r -= amount * math.sin(self.angle)
+            c += amount * math.cos(self.angle)
+        else:
+            c = round(c) + amount
+        self.position = [min(max(k, 0), n - 1), min(max(r, 0), rows - 1), min(max(c, 0), columns - 1)]
+        self.refresh()
+
+    def set_angle(self, degrees):
+        self.angle = math.radians(degrees)
+        self.refresh()
+
+    def set_window(self, window, level):
+        for view in self.views.values():
+            view.set_plane_window(window, level)
+
+
+class MprViewMixin:
+    # One view of an MprController, built on the regular viewer canvas so
+    # pan (right drag), zoom (scroll), window/level (middle drag), render
+    # coalescing and the F2 overlay all behave the same. Left click / drag
+    # moves the crosshair; shift + scroll and the arrow keys page planes.
+    # Planes are views into the volume, windowed through the usual LUT.
+    def attach(self, controller, orientation, window, level):
+        self.controller = controller
+        self.orientation = orientation
+        self.dicom_data = controller.volume.header
+        self.rescale = controller.volume.rescale
+        self.window = max(float(window), 1.0)
+        self.level = float(level)
+        self.moving = False
+        self.ax.axis("off")
+        self.crosshair = []
+        for _ in range(2):
+            line = Line2D([], [], color=CROSSHAIR_COLOR, linewidth=1, alpha=0.8, animated=True)
+            self.ax.add_line(line)
+            self.crosshair.append(line)
+
+    def draw_overlay_artists(self):
+        for line in self.crosshair:
+            self.ax.draw_artist(line)
+        super().draw_overlay_artists()
+
+    def show_plane(self, image, aspect):
+        reshaped = self.raw_frame is None or self.raw_frame.shape != image.shape
+        self.raw_frame = image
+        if reshaped:
+            # First image, or the sagittal view switched to / from oblique
+            if self.image is not None:
+                self.image.remove()
+                self.image = None
+            self.update_display()
+            rows, columns = image.shape
+            self.ax.set_aspect(aspect)
+            self.ax.set_xlim(-0.5, columns - 0.5)
+            # Axial keeps row 0 at the top; the reformats put the last
+            # slice (the top of an axial series) at the top
+            self.ax.set_ylim((rows - 0.5, -0.5) if self.orientation == AXIAL else (-0.5, rows - 0.5))
+        else:
+            self.ax.set_aspect(aspect)
+            self.window_dirty = True
+        self.update_title()
+        self.request_render(full=True)
+
+    def set_crosshair(self, lines):
+        for line, (xs, ys) in zip(self.crosshair, lines):
+            line.set_data(xs, ys)
+        self.request_render()
+
+    def update_title(self):
+        controller = self.controller
+        if self.orientation == SAGITTAL and controller.angle:
+            title = f"Oblique {math.degrees(controller.angle):.0f}\N{DEGREE SIGN}"
+        else:
+            count = controller.volume.plane_count(self.orientation)
+            title = f"{self.orientation.capitalize()} {controller.plane_index(self.orientation) + 1}/{count}"
+        title = f"{title}  [W {self.window:.0f} / L {self.level:.0f}]"
+        # A fixed title position skips matplotlib's tick label layout pass
+        # (the axes are off anyway), a large part of each plane redraw
+        self.ax.set_title(title, color='white' if self.is_dark_mode() else 'black', y=1.0)
+
+    def set_window(self, window, level):
+        # Window/level is shared by the three views
+        self.controller.set_window(window, level)
+
+    def set_plane_window(self, window, level):
+        super().set_window(window, level)
+
+    def on_key_press(self, event):
+        steps = {'down': 1, 'up': -1, 'pagedown': 10, 'pageup': -10}
+        if event.key in steps:
+            self.controller.step(self.orientation, steps[event.key])
+        else:
+            super().on_key_press(event)
+
+    def on_mouse_press(self, event):
+        if event.inaxes == self.ax and event.button == 1:
+            self.moving = True
+            self.controller.move_to(self.orientation, event.xdata, event.ydata)
+            return
+        super().on_mouse_press(event)
+
+    def on_mouse_move(self, event):
+        if self.moving:
+            if event.inaxes == self.ax:
+                self.controller.move_to(self.orientation, event.xdata, event.ydata)
+            return
+        super().on_mouse_move(event)
+
+    def on_mouse_release(self, event):
+        if self.moving:
+            self.moving = False
+            return
+        super().on_mouse_release(event)
+
+    def on_scroll(self, event):
+        if event.key == 'shift':
+            self.controller.step(self.orientation, -1 if event.button == 'up' else 1)
+            return
+        super().on_scroll(event)
+
+
+class MprCanvas(MprViewMixin, DicomCanvas):
+    def __init__(self, parent):
+        # Planes come from the volume, so the frame cache stays empty
+        DicomCanvas.__init__(self, parent, cache_bytes=0)
+
+
+class HeadlessMprCanvas(MprViewMixin, HeadlessDicomCanvas):
+    def __init__(self, figsize=(4, 4), dpi=100, defer=False):
+        HeadlessDicomCanvas.__init__(self, cache_bytes=0, figsize=figsize, dpi=dpi, defer=defer)
@@ -0,0 +1,59 @@
+import math
+
+from windowing import downsample
+
+# Frames with more pixels than this are shown through an ImagePyramid
+PYRAMID_MIN_PIXELS = 2048 * 2048
+# Edge of a tile in pixels of its level; the region shown is whole tiles
+TILE_SIZE = 256
+
+
+class ImagePyramid:
+    # Levels of a frame, each a 2x2 block mean of the one before in the
+    # stored dtype, made the first time they are needed and kept. region()
+    # picks the coarsest level that still has a pixel per screen pixel and
+    # crops it to the tiles in view, so what is windowed and resampled on a
+    # draw is bounded by the viewport, not the image.
+    def __init__(self, frame, tile_size=TILE_SIZE):
+        self.levels = [frame]
+        self.tile_size = tile_size
+        rows, columns = frame.shape[:2]
+        self.max_level = max(0, int(math.log2(min(rows, columns))))
+
+    def level(self, k):
+        while len(self.levels) <= k:
+            self.levels.append(downsample(self.levels[-1], 2))
+        return self.levels[k]
+
+    def choose_level(self, scale):
+        # scale is full-resolution pixels per screen pixel
+        if scale < 2:
+            return 0
+        return min(int(math.log2(scale)), self.max_level)
+
+    def region(self, xlim, ylim, width, height):
+        # (array, extent, key) covering the data limits xlim / ylim drawn on
+        # width x height screen pixels. array is a view into a level; extent
+        # places it in full-resolution data coordinates, as for imshow; key
+        # only changes when a different set of tiles is needed.
+        x0, x1 = sorted(xlim)
+        y0, y1 = sorted(ylim)
+        k = self.choose_level(max((x1 - x0) / max(width, 1), (y1 - y0) / max(height, 1)))
+        factor = 1 << k
+        level = self.level(k)
+        rows, columns = level.shape[:2]
+        tile = self.tile_size
+
+        def tiles(low, high, count):
+            # Level pixels low..high, widened to whole tiles
+            start = int(math.floor((low + 0.5) / factor)) // tile * tile
+            stop = -(-int(math.ceil((high + 0.5) / factor)) // tile) * tile
+            return min(max(start, 0), count), min(max(stop, 0), count)
+
+        c0, c1 = tiles(x0, x1, columns)
+        r0, r1 = tiles(y0, y1, rows)
+        if c0 >= c1 or r0 >= r1:
+            # Panned off the image: one corner tile, out of view anyway
+            c0, c1, r0, r1 = 0, min(tile, columns), 0, min(tile, rows)
+        extent = (c0 * factor - 0.5, c1 * factor - 0.5, r1 * factor - 0.5, r0 * factor - 0.5)
+        return level[r0:r1, c0:c1], extent, (k, r0, r1, c0, c1)
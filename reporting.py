@@ -0,0 +1,102 @@
+import io
+from datetime import datetime
+
+
+def report_lines(measurements):
+    # (text, bold) pairs shared by the report panel and the PDF
+    yield "=== Measurement Report ===", True
+    yield "", False
+    yield f"Total Measurements: {len(measurements)}", False
+    yield "", False
+
+    for i, measurement in enumerate(measurements, 1):
+        name, x0, y0, x1, y1, length, kind, points, stats = list(measurement) + ["line", None, None][len(measurement) - 6:]
+        stats = stats or {}
+        yield f"Measurement #{i}", True
+        yield f"Name: {name}", False
+        if kind == "line":
+            if stats.get("length_mm") is not None:
+                yield f"Length: {stats['length_mm']:.2f} mm ({length:.1f} pixels)", False
+            else:
+                yield f"Length: {length} pixels", False
+            yield f"Coordinates: ({x0}, {y0}) to ({x1}, {y1})", False
+        else:
+            yield f"Type: {kind.capitalize()} ROI", False
+            if "area" in stats:
+                yield f"Area: {stats['area']:.2f} {stats['area_unit']} ({stats['pixels']} pixels)", False
+            if stats.get("mean") is not None:
+                unit = f" {stats['unit']}" if stats.get("unit") else ""
+                yield f"Mean: {stats['mean']:.1f}{unit}  SD: {stats['std']:.1f}{unit}", False
+                yield f"Min: {stats['min']:.1f}{unit}  Max: {stats['max']:.1f}{unit}", False
+            yield f"Bounds: ({x0:.1f}, {y0:.1f}) to ({x1:.1f}, {y1:.1f})", False
+        yield "", False
+
+
+def build_report_text(measurements):
+    return "".join(f"{line}\n" for line, _ in report_lines(measurements))
+
+
+def render_figure_png(fig):
+    # The figure snapshot stays in memory; nothing is written to disk
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight', facecolor=fig.get_facecolor())
+    buffer.seek(0)
+    return buffer
+
+
+def write_report_pdf(pdf_path, measurements, image=None):
+    # image is a PNG buffer from render_figure_png (or any ImageReader source)
+    # reportlab is only imported once a PDF is actually written
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas as pdf_canvas
+
+    c = pdf_canvas.Canvas(pdf_path, pagesize=letter)
+
+    # Set up PDF styles
+    c.setFont("Helvetica", 12)
+    c.setFillColorRGB(0, 0, 0)  # Black text
+
+    # Write report header
+    c.drawString(50, 750, "DICOM Measurement Report")
+    c.setFont("Helvetica", 10)
+    c.drawString(50, 730, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    c.line(50, 725, 550, 725)
+
+    # Write report text
+    y = 700
+    for line, bold in report_lines(measurements):
+        c.setFont("Helvetica-Bold" if bold else "Helvetica", 10)
+        c.drawString(50, y, line)
+        y -= 15
+        if y < 100:
+            c.showPage()
+            y = 750
+            c.setFont("Helvetica", 10)
+
+    # Insert the image if one was rendered
+    if image is not None:
+        try:
+            if hasattr(image, 'seek'):
+                image.seek(0)
+            reader = ImageReader(image)
+            img_width, img_height = reader.getSize()
+            aspect = img_height / float(img_width)
+
+            c.showPage()
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(50, 750, "DICOM Image with Measurements")
+
+            # Scale image to fit page width with some margins
+            max_width = 500
+            max_height = max_width * aspect
+            if max_height > 600:
+                max_height = 600
+                max_width = max_height / aspect
+
+            c.drawImage(reader, (letter[0]-max_width)/2, 750-max_height-20,
+                       width=max_width, height=max_height, mask='auto')
+        except Exception as e:
+            c.drawString(50, 730, f"Could not insert image: {str(e)}")
+
+    c.save()
@@ -0,0 +1,276 @@
+import math
+
+import numpy as np
+
+LINE = "line"
+RECTANGLE = "rectangle"
+ELLIPSE = "ellipse"
+POLYGON = "polygon"
+KINDS = (LINE, RECTANGLE, ELLIPSE, POLYGON)
+
+# Vertices used to draw and hit-test an ellipse outline
+ELLIPSE_VERTICES = 48
+
+# A measurement is [name, x0, y0, x1, y1, length, kind, points, stats].
+# x0..y1 are the end points of a line or the bounding box of an ROI,
+# length is the line length in pixels (None for ROIs), points holds the
+# vertices of a polygon and stats the calibrated results.
+
+
+def as_measurement(measurement):
+    # Older 6-field [name, x0, y0, x1, y1, length] rows are lines
+    measurement = list(measurement)
+    return measurement + [LINE, None, None][len(measurement) - 6:]
+
+
+def pixel_spacing(ds):
+    # (row spacing, column spacing) in mm, or None when uncalibrated
+    for keyword in ("PixelSpacing", "ImagerPixelSpacing"):
+        value = getattr(ds, keyword, None)
+        try:
+            if value is not None and len(value) >= 2 and float(value[0]) > 0 and float(value[1]) > 0:
+                return float(value[0]), float(value[1])
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def value_unit(ds):
+    if getattr(ds, 'Modality', '') == 'CT' or getattr(ds, 'RescaleType', '') == 'HU':
+        return "HU"
+    return ""
+
+
+def outline(measurement):
+    # (vertices, closed) in image coordinates
+    name, x0, y0, x1, y1, length, kind, points, stats = measurement
+    if kind == RECTANGLE:
+        return [(x0, y0), (x1, y0), (x1, y1), (x0, y1)], True
+    if kind == ELLIPSE:
+        cx, cy, rx, ry = (x0 + x1) / 2, (y0 + y1) / 2, abs(x1 - x0) / 2, abs(y1 - y0) / 2
+        angles = np.linspace(0, 2 * np.pi, ELLIPSE_VERTICES, endpoint=False)
+        return list(zip(cx + rx * np.cos(angles), cy + ry * np.sin(angles))), True
+    if kind == POLYGON:
+        return [tuple(point) for point in points], True
+    return [(x0, y0), (x1, y1)], False
+
+
+def handles(measurement):
+    # Points that can be dragged individually; index is the edit "part"
+    if measurement[6] == POLYGON:
+        return [tuple(point) for point in measurement[7]]
+    return [(measurement[1], measurement[2]), (measurement[3], measurement[4])]
+
+
+def moved(measurement, part, x, y, dx, dy):
+    # Copy of the measurement with handle `part` at (x, y), or translated
+    # by (dx, dy) when part is None. Stats are left for the caller.
+    measurement = list(measurement)
+    name, x0, y0, x1, y1, length, kind, points, stats = measurement
+    if kind == POLYGON:
+        if part is None:
+            points = [(px + dx, py + dy) for px, py in points]
+        else:
+            points = [(x, y) if i == part else tuple(point) for i, point in enumerate(points)]
+        xs, ys = zip(*points)
+        measurement[1:5] = min(xs), min(ys), max(xs), max(ys)
+        measurement[7] = points
+    elif part is None:
+        measurement[1:5] = x0 + dx, y0 + dy, x1 + dx, y1 + dy
+    elif part == 0:
+        measurement[1:3] = x, y
+    else:
+        measurement[3:5] = x, y
+    if kind == LINE:
+        measurement[5] = math.hypot(measurement[3] - measurement[1], measurement[4] - measurement[2])
+    return measurement
+
+
+def geometric_area(measurement):
+    # Area in square pixels
+    name, x0, y0, x1, y1, length, kind, points, stats = measurement
+    if kind == RECTANGLE:
+        return abs(x1 - x0) * abs(y1 - y0)
+    if kind == ELLIPSE:
+        return math.pi * abs(x1 - x0) * abs(y1 - y0) / 4
+    if kind == POLYGON:
+        xs, ys = np.asarray(points, dtype=float).T
+        return abs(np.dot(xs, np.roll(ys, 1)) - np.dot(ys, np.roll(xs, 1))) / 2
+    return 0.0
+
+
+def polygon_mask(points, rows, cols, row0, col0):
+    # Even-odd test of pixel centres, one vectorized pass per edge
+    y = np.arange(row0, row0 + rows, dtype=float)[:, None]
+    x = np.arange(col0, col0 + cols, dtype=float)[None, :]
+    mask = np.zeros((rows, cols), dtype=bool)
+    vertices = np.asarray(points, dtype=float)
+    for (xa, ya), (xb, yb) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if ya == yb:
+            continue
+        crosses = (ya > y) != (yb > y)
+        x_cross = xa + (y - ya) * (xb - xa) / (yb - ya)
+        mask ^= crosses & (x < x_cross)
+    return mask
+
+
+class IntegralImage:
+    # Summed-area tables of a frame's stored values and their squares, so
+    # the count, mean and standard deviation of any axis-aligned box cost
+    # four lookups. The tables are only built when first needed.
+    def __init__(self, frame):
+        values = frame.mean(axis=-1) if frame.ndim == 3 else frame
+        self.values = values
+        self._sums = None
+        self._squares = None
+
+    def _tables(self):
+        if self._sums is None:
+            # Integer data is summed exactly in int64. Squares of 32-bit
+            # values can overflow it over a large box, so those are summed
+            # in float64.
+            integer = np.issubdtype(self.values.dtype, np.integer)
+            dtype = np.int64 if integer else np.float64
+            square_dtype = np.int64 if integer and self.values.dtype.itemsize <= 2 else np.float64
+            values = self.values.astype(dtype)
+            shape = (values.shape[0] + 1, values.shape[1] + 1)
+            self._sums = np.zeros(shape, dtype=dtype)
+            self._squares = np.zeros(shape, dtype=square_dtype)
+            np.cumsum(np.cumsum(values, axis=0), axis=1, out=self._sums[1:, 1:])
+            squares = values.astype(square_dtype)
+            np.cumsum(np.cumsum(squares * squares, axis=0), axis=1, out=self._squares[1:, 1:])
+        return self._sums, self._squares
+
+    def pixel_box(self, x0, y0, x1, y1):
+        # Half-open (r0, r1, c0, c1) of the pixels whose centres lie in the box
+        rows, cols = self.values.shape
+        c0 = np.clip(np.ceil(np.minimum(x0, x1)), 0, cols).astype(np.intp)
+        c1 = np.clip(np.floor(np.maximum(x0, x1)) + 1, 0, cols).astype(np.intp)
+        r0 = np.clip(np.ceil(np.minimum(y0, y1)), 0, rows).astype(np.intp)
+        r1 = np.clip(np.floor(np.maximum(y0, y1)) + 1, 0, rows).astype(np.intp)
+        return r0, np.maximum(r1, r0), c0, np.maximum(c1, c0)
+
+    def box_moments(self, r0, r1, c0, c1):
+        # (count, sum, sum of squares); works on scalars or arrays of boxes
+        sums, squares = self._tables()
+        count = (r1 - r0) * (c1 - c0)
+        total = sums[r1, c1] - sums[r0, c1] - sums[r1, c0] + sums[r0, c0]
+        total_sq = squares[r1, c1] - squares[r0, c1] - squares[r1, c0] + squares[r0, c0]
+        return count, total, total_sq
+
+
+def _summarise(count, total, total_sq, minimum, maximum, slope, intercept):
+    # Moments of stored values -> mean/std/min/max of rescaled values
+    count = np.asarray(count, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.asarray(total, dtype=float) / count
+        variance = np.maximum(np.asarray(total_sq, dtype=float) / count - mean * mean, 0.0)
+    low, high = (minimum, maximum) if slope >= 0 else (maximum, minimum)
+    return mean * slope + intercept, np.sqrt(variance) * abs(slope), \
+        np.asarray(low, dtype=float) * slope + intercept, np.asarray(high, dtype=float) * slope + intercept
+
+
+def _roi_stats(measurement, count, mean, std, minimum, maximum, spacing, unit):
+    area = geometric_area(measurement)
+    stats = {"pixels": int(count), "area": float(area), "area_unit": "px²", "unit": unit,
+             "mean": None, "std": None, "min": None, "max": None}
+    if spacing is not None:
+        stats["area"] = float(area * spacing[0] * spacing[1])
+        stats["area_unit"] = "mm²"
+    if count:
+        stats.update(mean=float(mean), std=float(std), min=float(minimum), max=float(maximum))
+    return stats
+
+
+def masked_region(integral, measurement):
+    # (values, mask) over the ROI's bounding box
+    name, x0, y0, x1, y1, length, kind, points, stats = measurement
+    r0, r1, c0, c1 = (int(v) for v in integral.pixel_box(x0, y0, x1, y1))
+    region = integral.values[r0:r1, c0:c1]
+    if kind == ELLIPSE:
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        rx, ry = max(abs(x1 - x0) / 2, 1e-9), max(abs(y1 - y0) / 2, 1e-9)
+        y = (np.arange(r0, r1, dtype=float)[:, None] - cy) / ry
+        x = (np.arange(c0, c1, dtype=float)[None, :] - cx) / rx
+        mask = x * x + y * y <= 1.0
+    elif kind == POLYGON:
+        mask = polygon_mask(points, r1 - r0, c1 - c0, r0, c0)
+    else:
+        mask = np.ones(region.shape, dtype=bool)
+    return region, mask
+
+
+def preview_stats(integral, measurement, slope, intercept, spacing, unit):
+    # Cheap stats while an ROI is being dragged: a rectangle is four
+    # table lookups; min/max are left out until the ROI is finished
+    if measurement[6] == RECTANGLE:
+        count, total, total_sq = integral.box_moments(*integral.pixel_box(*measurement[1:5]))
+        mean, std, _, _ = _summarise(count, total, total_sq, 0, 0, slope, intercept)
+        stats = _roi_stats(measurement, count, mean, std, 0, 0, spacing, unit)
+        stats["min"] = stats["max"] = None
+        return stats
+    return measure(integral, measurement, slope, intercept, spacing, unit)
+
+
+def measure(integral, measurement, slope, intercept, spacing, unit):
+    return measure_all(integral, [measurement], slope, intercept, spacing, unit)[0]
+
+
+def measure_all(integral, measurements, slope, intercept, spacing, unit):
+    # Stats for every measurement of one frame. Line lengths and rectangle
+    # moments are computed for all of them at once; ellipse and polygon
+    # masks are one vectorized reduction each.
+    results = [None] * len(measurements)
+    kinds = [m[6] for m in measurements]
+
+    lines = [i for i, kind in enumerate(kinds) if kind == LINE]
+    if lines:
+        coords = np.array([measurements[i][1:5] for i in lines], dtype=float)
+        dx, dy = coords[:, 2] - coords[:, 0], coords[:, 3] - coords[:, 1]
+        lengths_mm = np.hypot(dx * spacing[1], dy * spacing[0]) if spacing is not None else [None] * len(lines)
+        for i, length_mm in zip(lines, lengths_mm):
+            results[i] = {"length_mm": None if length_mm is None else float(length_mm)}
+
+    rects = [i for i, kind in enumerate(kinds) if kind == RECTANGLE]
+    if rects:
+        coords = np.array([measurements[i][1:5] for i in rects], dtype=float).T
+        r0, r1, c0, c1 = integral.pixel_box(*coords)
+        count, total, total_sq = integral.box_moments(r0, r1, c0, c1)
+        minimum = np.zeros(len(rects))
+        maximum = np.zeros(len(rects))
+        for j in np.flatnonzero(count):
+            region = integral.values[r0[j]:r1[j], c0[j]:c1[j]]
+            minimum[j], maximum[j] = region.min(), region.max()
+        mean, std, low, high = _summarise(count, total, total_sq, minimum, maximum, slope, intercept)
+        for j, i in enumerate(rects):
+            results[i] = _roi_stats(measurements[i], count[j], mean[j], std[j], low[j], high[j], spacing, unit)
+
+    for i, kind in enumerate(kinds):
+        if kind not in (ELLIPSE, POLYGON):
+            continue
+        region, mask = masked_region(integral, measurements[i])
+        selected = region[mask]
+        if selected.size:
+            wide = selected.astype(np.int64 if np.issubdtype(selected.dtype, np.integer) else np.float64)
+            mean, std, low, high = _summarise(selected.size, wide.sum(), (wide * wide).sum(),
+                                              selected.min(), selected.max(), slope, intercept)
+        else:
+            mean = std = low = high = None
+        results[i] = _roi_stats(measurements[i], selected.size, mean, std, low, high, spacing, unit)
+    return results
+
+
+def describe(measurement):
+    # Short label text for the canvas (just the values while drawing)
+    name, x0, y0, x1, y1, length, kind, points, stats = measurement
+    stats = stats or {}
+    prefix = f"{name}: " if name else ""
+    if kind == LINE:
+        if stats.get("length_mm") is not None:
+            return f"{prefix}{stats['length_mm']:.1f} mm"
+        return f"{prefix}{length:.1f}"
+    text = f"{prefix}{stats.get('area', 0.0):.1f} {stats.get('area_unit', 'px²')}"
+    if stats.get("mean") is not None:
+        unit = f" {stats['unit']}" if stats.get("unit") else ""
+        text += f"\n{stats['mean']:.1f} ± {stats['std']:.1f}{unit}"
+    return text
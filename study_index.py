@@ -0,0 +1,210 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pydicom
+
+from dicom_io import LoadCancelled
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".dicom_viewer", "study_index.db")
+
+# Only these tags are parsed when indexing
+INDEX_TAGS = [
+    "PatientID", "PatientName", "StudyInstanceUID", "StudyDate", "StudyDescription",
+    "SeriesInstanceUID", "SeriesNumber", "SeriesDescription", "Modality",
+    "SOPInstanceUID", "InstanceNumber", "NumberOfFrames", "Rows",
+]
+
+COLUMNS = [
+    "patient_id", "patient_name", "study_uid", "study_date", "study_description",
+    "series_uid", "series_number", "series_description", "modality",
+    "sop_uid", "instance_number", "frames",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    patient_id TEXT, patient_name TEXT,
+    study_uid TEXT, study_date TEXT, study_description TEXT,
+    series_uid TEXT, series_number INTEGER, series_description TEXT, modality TEXT,
+    sop_uid TEXT, instance_number INTEGER, frames INTEGER
+);
+CREATE INDEX IF NOT EXISTS instances_series ON instances (series_uid);
+"""
+
+SCAN_CHUNK_SIZE = 256
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_index_header(path):
+    # Runs in worker processes. Files that aren't DICOM images still get a
+    # row (with no SOP UID) so they're skipped on the next scan.
+    try:
+        ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=INDEX_TAGS)
+    except Exception:
+        return None
+    if 'Rows' not in ds:
+        return None
+    return (
+        str(ds.get('PatientID', '')), str(ds.get('PatientName', '')),
+        str(ds.get('StudyInstanceUID', '')), str(ds.get('StudyDate', '')), str(ds.get('StudyDescription', '')),
+        str(ds.get('SeriesInstanceUID', '')), _int_or_none(ds.get('SeriesNumber')),
+        str(ds.get('SeriesDescription', '')), str(ds.get('Modality', '')),
+        str(ds.get('SOPInstanceUID', '')), _int_or_none(ds.get('InstanceNumber')),
+        _int_or_none(ds.get('NumberOfFrames')) or 1,
+    )
+
+
+def _nest(rows):
+    # (path, *COLUMNS) rows as {(patient_id, patient_name): {study_uid:
+    # {"date", "description", "series": {series_uid: {"number",
+    # "description", "modality", "instances": [(instance_number, path,
+    # frames, sop_uid)]}}}}}, in row order
+    patients = {}
+    for (path, patient_id, patient_name, study_uid, study_date, study_description, series_uid,
+         series_number, series_description, modality, sop_uid, instance_number, frames) in rows:
+        studies = patients.setdefault((patient_id, patient_name), {})
+        study = studies.setdefault(study_uid, {"date": study_date, "description": study_description, "series": {}})
+        series = study["series"].setdefault(series_uid, {
+            "number": series_number, "description": series_description,
+            "modality": modality, "instances": [],
+        })
+        series["instances"].append((instance_number, path, frames, sop_uid))
+    return patients
+
+
+class StudyIndex:
+    # Header-only index of a folder tree, persisted in SQLite and keyed by
+    # path + mtime + size so rescans only parse files that changed
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    def scan(self, root, progress=None, cancel=None, workers=None):
+        # Returns the number of files that had to be (re)parsed
+        root = os.path.abspath(root)
+        prefix = os.path.join(root, "")
+        with self._lock:
+            known = {
+                path: (mtime, size) for path, mtime, size in self.conn.execute(
+                    "SELECT path, mtime, size FROM instances WHERE path >= ? AND path < ?",
+                    (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+                )
+            }
+
+        changed = []
+        seen = set()
+        for dirpath, dirs, files in os.walk(root):
+            if cancel is not None and cancel.is_set():
+                raise LoadCancelled(root)
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(path)
+                if known.get(path) != (stat.st_mtime, stat.st_size):
+                    changed.append((path, stat.st_mtime, stat.st_size))
+
+        removed = [path for path in known if path not in seen]
+        self._index(changed, progress, cancel, workers, root)
+        if removed:
+            with self._lock:
+                self.conn.executemany("DELETE FROM instances WHERE path = ?", [(path,) for path in removed])
+                self.conn.commit()
+        return len(changed)
+
+    def add_files(self, paths, workers=None):
+        # Indexes files reported by a FolderWatcher, skipping those already
+        # indexed with the same mtime and size. Returns the images among
+        # them nested like tree(), for merging into what is shown.
+        known = {}
+        with self._lock:
+            for start in range(0, len(paths), SCAN_CHUNK_SIZE):
+                chunk = paths[start:start + SCAN_CHUNK_SIZE]
+                known.update((path, (mtime, size)) for path, mtime, size in self.conn.execute(
+                    f"SELECT path, mtime, size FROM instances WHERE path IN ({', '.join('?' * len(chunk))})", chunk
+                ))
+        changed = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if known.get(path) != (stat.st_mtime, stat.st_size):
+                changed.append((path, stat.st_mtime, stat.st_size))
+        sop_uid = 3 + COLUMNS.index("sop_uid")
+        return _nest([(row[0],) + row[3:] for row in self._index(changed, workers=workers) if row[sop_uid] is not None])
+
+    def _index(self, changed, progress=None, cancel=None, workers=None, label="index"):
+        # Parses the headers of (path, mtime, size) entries and stores them,
+        # returning the stored rows. Small batches aren't worth starting
+        # worker processes for.
+        paths = [path for path, _, _ in changed]
+        executor = ProcessPoolExecutor(max_workers=workers) if len(changed) > SCAN_CHUNK_SIZE else None
+        stored = []
+        try:
+            if executor is not None:
+                headers = executor.map(read_index_header, paths, chunksize=SCAN_CHUNK_SIZE)
+            else:
+                headers = map(read_index_header, paths)
+            rows = []
+            for done, ((path, mtime, size), header) in enumerate(zip(changed, headers), 1):
+                if cancel is not None and cancel.is_set():
+                    raise LoadCancelled(label)
+                rows.append((path, mtime, size) + (header or (None,) * len(COLUMNS)))
+                if len(rows) >= SCAN_CHUNK_SIZE:
+                    self._store(rows)
+                    stored.extend(rows)
+                    rows = []
+                if progress is not None and (done % SCAN_CHUNK_SIZE == 0 or done == len(changed)):
+                    progress(done, len(changed))
+            self._store(rows)
+            stored.extend(rows)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return stored
+
+    def _store(self, rows):
+        if not rows:
+            return
+        placeholders = ", ".join("?" * (3 + len(COLUMNS)))
+        with self._lock:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO instances (path, mtime, size, {', '.join(COLUMNS)}) VALUES ({placeholders})",
+                rows
+            )
+            self.conn.commit()
+
+    def tree(self, root):
+        # Every indexed image under root, nested as described in _nest
+        prefix = os.path.join(os.path.abspath(root), "")
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT path, {', '.join(COLUMNS)} "
+                "FROM instances WHERE sop_uid IS NOT NULL AND path >= ? AND path < ? "
+                "ORDER BY patient_name, study_date, series_number, instance_number, path",
+                (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+            ).fetchall()
+        return _nest(rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
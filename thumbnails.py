@@ -0,0 +1,164 @@
+import io
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pydicom
+from pydicom.uid import JPEG2000, JPEG2000Lossless, JPEGBaseline8Bit
+
+from dicom_io import DiskFrameCache, LoadCancelled, decode_pixels, map_native_frames
+from windowing import apply_window, default_window, downsample
+
+# Longest side of a thumbnail in pixels
+THUMBNAIL_SIZE = 64
+DEFAULT_THUMBNAIL_DIR = os.path.join(os.path.expanduser("~"), ".dicom_viewer", "thumbnails")
+DEFAULT_THUMBNAIL_CACHE_BYTES = 256 * 1024 * 1024
+THUMBNAIL_CHUNK_SIZE = 16
+
+# Codecs Pillow can decode at a fraction of the full resolution: JPEG by
+# DCT scaling (1/2 .. 1/8), JPEG 2000 by skipping wavelet levels
+REDUCED_DECODE_SYNTAXES = {JPEGBaseline8Bit, JPEG2000, JPEG2000Lossless}
+
+
+def _reduced_decode(ds, pixel_data, factor):
+    # First frame decoded at roughly 1/factor of its size, or None if the
+    # codec can't do that for this data
+    from PIL import Image
+    try:
+        from pydicom.encaps import get_frame
+    except ImportError:
+        return None  # pydicom < 3; the full decode covers it
+    frames = int(ds.get('NumberOfFrames', 1) or 1)
+    image = Image.open(io.BytesIO(get_frame(pixel_data, 0, number_of_frames=frames)))
+    if image.format == "JPEG":
+        image.draft(image.mode, (ds.Columns // factor, ds.Rows // factor))
+    elif image.format == "JPEG2000":
+        image.reduce = min(int(math.log2(factor)), 5)
+    else:
+        return None
+    return np.asarray(image)
+
+
+def first_frame(path, ds, factor):
+    # The first frame, already reduced where that's cheap: uncompressed
+    # pixel data is memory-mapped, JPEG / JPEG 2000 decode at low resolution
+    frames = map_native_frames(path)
+    if frames is not None:
+        return frames[0]
+    transfer_syntax = ds.file_meta.get('TransferSyntaxUID')
+    if transfer_syntax in REDUCED_DECODE_SYNTAXES and ds.get('PixelRepresentation', 0) == 0 and factor > 1:
+        full = pydicom.dcmread(path)
+        try:
+            frame = _reduced_decode(full, full.PixelData, factor)
+        except Exception:
+            frame = None  # e.g. 12-bit JPEG, which Pillow can't read
+        if frame is not None:
+            return frame
+    if decode_pixels is not None:
+        return decode_pixels(path, index=0)
+    array = pydicom.dcmread(path).pixel_array
+    return array[0] if int(ds.get('NumberOfFrames', 1) or 1) > 1 else array
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    # Runs in worker processes. Returns a uint8 image (greyscale or RGB)
+    # no larger than size on either side, or None if it isn't an image.
+    try:
+        ds = pydicom.dcmread(path, stop_before_pixels=True)
+        if 'Rows' not in ds:
+            return None
+        frame = first_frame(path, ds, max(1, math.ceil(max(ds.Rows, ds.Columns) / size)))
+        frame = downsample(frame, max(1, math.ceil(max(frame.shape[:2]) / size)))
+        if frame.ndim == 3:
+            return np.ascontiguousarray(frame, dtype=np.uint8)
+        slope = float(getattr(ds, 'RescaleSlope', 1) or 1)
+        intercept = float(getattr(ds, 'RescaleIntercept', 0) or 0)
+        window, level = default_window(ds, frame, slope, intercept)
+        invert = getattr(ds, 'PhotometricInterpretation', '') == 'MONOCHROME1'
+        return np.ascontiguousarray(apply_window(frame, slope, intercept, window, level, invert))
+    except Exception:
+        return None
+
+
+class ThumbnailCache(DiskFrameCache):
+    # Thumbnails on disk keyed by SOPInstanceUID (and size), with the same
+    # size-bounded LRU eviction as the frame cache
+    def __init__(self, directory=DEFAULT_THUMBNAIL_DIR, max_bytes=DEFAULT_THUMBNAIL_CACHE_BYTES,
+                 size=THUMBNAIL_SIZE):
+        super().__init__(directory, max_bytes)
+        self.size = size
+
+    def lookup(self, uid):
+        array = self.get(uid, None, f"thumbnail-{self.size}")
+        return None if array is None else np.array(array)
+
+    def store(self, uid, array):
+        self.put(uid, None, f"thumbnail-{self.size}", array)
+
+
+class ThumbnailFeed:
+    # Items for a running generate_thumbnails job. More can be added while
+    # it runs; once the job has found the feed empty it is closed, add()
+    # returns False and the caller starts another job.
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def add(self, items):
+        with self._lock:
+            if self.closed:
+                return False
+            self.items.extend(items)
+            return True
+
+    def take(self):
+        with self._lock:
+            items, self.items = self.items, []
+            if not items:
+                self.closed = True
+            return items
+
+
+def generate_thumbnails(items, cache, emit, cancel=None, workers=None, size=THUMBNAIL_SIZE):
+    # items are (key, path) pairs, key being the SOPInstanceUID, or a
+    # ThumbnailFeed of them. emit(key, image) is called for every thumbnail
+    # as soon as it's available: cached ones straight away, the rest as the
+    # process pool makes them. The pool is started once, on the first miss,
+    # and serves everything added to the feed until it runs dry.
+    feed = items if isinstance(items, ThumbnailFeed) else ThumbnailFeed(items)
+    executor = None
+    made = 0
+    try:
+        while True:
+            misses = []
+            for key, path in feed.take():
+                if cancel is not None and cancel.is_set():
+                    raise LoadCancelled("thumbnails")
+                image = cache.lookup(key) if cache is not None and key else None
+                if image is not None:
+                    emit(key, image)
+                else:
+                    misses.append((key, path))
+            if feed.closed:
+                return made
+            if not misses:
+                continue
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            images = executor.map(make_thumbnail, [path for _, path in misses], [size] * len(misses),
+                                  chunksize=THUMBNAIL_CHUNK_SIZE)
+            for (key, path), image in zip(misses, images):
+                if cancel is not None and cancel.is_set():
+                    raise LoadCancelled("thumbnails")
+                if image is None:
+                    continue
+                if cache is not None and key:
+                    cache.store(key, image)
+                emit(key, image)
+            made += len(misses)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,50 @@
+# What a ViewportLink can keep in step between viewports
+LINK_VIEW = "view"  # pan and zoom
+LINK_WINDOW = "window"  # window / level
+LINK_SLICE = "slice"
+LINK_KINDS = (LINK_VIEW, LINK_WINDOW, LINK_SLICE)
+
+
+class ViewportLink:
+    # The viewports of a layout. When one of them is panned, zoomed,
+    # windowed or paged by the user, the change is pushed to the others for
+    # each kind that is linked. Followers take it through their follow_*
+    # methods, which blit instead of redrawing the whole figure.
+    def __init__(self, kinds=()):
+        self.viewports = []
+        self.kinds = set(kinds)
+        self.propagating = False
+
+    def add(self, viewport):
+        viewport.link = self
+        self.viewports.append(viewport)
+
+    def remove(self, viewport):
+        if viewport in self.viewports:
+            self.viewports.remove(viewport)
+        viewport.link = None
+
+    def set_linked(self, kind, linked):
+        if linked:
+            self.kinds.add(kind)
+        else:
+            self.kinds.discard(kind)
+
+    def changed(self, source, kind, value=None):
+        # value is the slice step for LINK_SLICE
+        if kind not in self.kinds or self.propagating:
+            return
+        # Followers don't push their own updates on to the others
+        self.propagating = True
+        try:
+            for viewport in self.viewports:
+                if viewport is source or viewport.stack is None or viewport.raw_frame is None:
+                    continue
+                if kind == LINK_VIEW:
+                    viewport.follow_view(source)
+                elif kind == LINK_WINDOW:
+                    viewport.follow_window(source.window, source.level)
+                else:
+                    viewport.follow_slice(value)
+        finally:
+            self.propagating = False
@@ -0,0 +1,189 @@
+import os
+import tempfile
+
+import numpy as np
+
+from dicom_io import LoadCancelled
+from roi_stats import pixel_spacing
+
+AXIAL = "axial"
+CORONAL = "coronal"
+SAGITTAL = "sagittal"
+ORIENTATIONS = (AXIAL, CORONAL, SAGITTAL)
+
+# Volumes larger than this are assembled in a temporary memory-mapped file
+# rather than in RAM
+DEFAULT_MEMMAP_BYTES = 1024 ** 3
+
+
+def _rescale(ds):
+    return (float(getattr(ds, 'RescaleSlope', 1) or 1),
+            float(getattr(ds, 'RescaleIntercept', 0) or 0))
+
+
+def slice_spacing(headers):
+    # Distance (mm) between slices along the slice normal
+    positions = []
+    for ds in headers:
+        position = getattr(ds, 'ImagePositionPatient', None)
+        orientation = getattr(ds, 'ImageOrientationPatient', None)
+        if position is None or orientation is None or len(orientation) != 6:
+            positions = []
+            break
+        normal = np.cross(np.array(orientation[:3], dtype=float), np.array(orientation[3:], dtype=float))
+        positions.append(float(np.dot(normal, np.array(position, dtype=float))))
+    if len(positions) > 1:
+        steps = np.abs(np.diff(positions))
+        steps = steps[steps > 0]
+        if steps.size:
+            return float(np.median(steps))
+    for keyword in ("SpacingBetweenSlices", "SliceThickness"):
+        try:
+            value = float(getattr(headers[0], keyword, 0) or 0)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            return value
+    return 1.0
+
+
+class Volume:
+    # A series as one contiguous (slices, rows, columns) array in its stored
+    # dtype. Axial, coronal and sagittal planes are strided views into it;
+    # oblique planes are interpolated. Slices are in DicomStack order, i.e.
+    # ascending position along the slice normal.
+    def __init__(self, data, spacing, rescale, header=None, path=None):
+        self.data = data
+        self.header = header  # first slice, for windowing and calibration
+        self.spacing = spacing  # (slice, row, column) in mm
+        self.rescale = rescale
+        self.path = path  # backing file when assembled into a memmap
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @classmethod
+    def from_stack(cls, stack, memmap_bytes=DEFAULT_MEMMAP_BYTES, progress=None, cancel=None):
+        if len(stack) < 2:
+            raise ValueError("MPR needs a series of at least two slices")
+        first = stack.frame(0)
+        if first.ndim != 2:
+            raise ValueError("MPR needs greyscale images")
+        headers = [stack.header(i) for i in range(len(stack))]
+        rows, columns = first.shape
+        spacing = (slice_spacing(headers),) + (pixel_spacing(headers[0]) or (1.0, 1.0))
+        rescales = {_rescale(ds) for ds in headers}
+
+        # A multi-frame file with native pixel data is already a volume
+        paths = {path for path, _ in stack.slices}
+        if len(paths) == 1 and len(rescales) == 1:
+            mapped = stack.mapped_frames(next(iter(paths)))
+            if mapped is not None and mapped.ndim == 3 and mapped.shape[0] == len(stack):
+                if progress is not None:
+                    progress(len(stack), len(stack))
+                return cls(mapped, spacing, rescales.pop(), headers[0])
+
+        # Per-slice rescale values that differ are applied while copying
+        uniform = len(rescales) == 1
+        dtype = first.dtype if uniform else np.dtype(np.float32)
+        shape = (len(stack), rows, columns)
+        path = None
+        if int(np.prod(shape)) * dtype.itemsize > memmap_bytes:
+            fd, path = tempfile.mkstemp(prefix="dicom_viewer_", suffix=".vol")
+            os.close(fd)
+            data = np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+        else:
+            data = np.empty(shape, dtype=dtype)
+        try:
+            for i in range(len(stack)):
+                if cancel is not None and cancel.is_set():
+                    raise LoadCancelled("volume")
+                frame = stack.frame(i)
+                if frame.shape != (rows, columns):
+                    raise ValueError(f"Slice {i + 1} is {frame.shape[1]}x{frame.shape[0]}, expected {columns}x{rows}")
+                if uniform:
+                    data[i] = frame
+                else:
+                    slope, intercept = _rescale(headers[i])
+                    data[i] = frame * slope + intercept
+                if progress is not None:
+                    progress(i + 1, len(stack))
+        except BaseException:
+            if path is not None:
+                del data
+                os.remove(path)
+            raise
+        return cls(data, spacing, rescales.pop() if uniform else (1.0, 0.0), headers[0], path)
+
+    def plane_count(self, orientation):
+        return self.data.shape[ORIENTATIONS.index(orientation)]
+
+    def plane(self, orientation, index):
+        # Zero-copy view: axial is (rows, columns), coronal is (slices,
+        # columns) and sagittal is (slices, rows)
+        if orientation == AXIAL:
+            return self.data[index]
+        if orientation == CORONAL:
+            return self.data[:, index, :]
+        return self.data[:, :, index]
+
+    def aspect(self, orientation):
+        # Display aspect (height / width of a pixel) of a plane
+        slice_mm, row_mm, column_mm = self.spacing
+        if orientation == AXIAL:
+            return row_mm / column_mm
+        if orientation == CORONAL:
+            return slice_mm / column_mm
+        return slice_mm / row_mm
+
+    def oblique(self, row, column, angle):
+        # The plane containing the slice axis and the in-plane direction
+        # (cos angle, sin angle) in (row, column) through (row, column).
+        # Returns (image of shape (slices, width), base point, direction);
+        # image column t lies at base + (t - width / 2) * direction.
+        n, rows, columns = self.data.shape
+        direction = np.array([np.cos(angle), np.sin(angle)])
+        # Sampling starts from the point of the line nearest the volume
+        # centre, so moving along the line doesn't shift the image
+        point = np.array([row, column], dtype=float)
+        centre = np.array([(rows - 1) / 2, (columns - 1) / 2])
+        base = point + np.dot(centre - point, direction) * direction
+        width = int(np.ceil(np.hypot(rows, columns)))
+        t = np.arange(width) - width / 2
+        r = base[0] + t * direction[0]
+        c = base[1] + t * direction[1]
+        outside = (r < -0.5) | (r > rows - 0.5) | (c < -0.5) | (c > columns - 0.5)
+
+        # The plane holds the slice axis, so every sample lies on a slice and
+        # trilinear interpolation reduces to bilinear within the slices: four
+        # gathers of whole (slices, width) columns
+        r = np.clip(r, 0, rows - 1)
+        c = np.clip(c, 0, columns - 1)
+        r0 = np.minimum(r.astype(np.intp), max(rows - 2, 0))
+        c0 = np.minimum(c.astype(np.intp), max(columns - 2, 0))
+        r1 = np.minimum(r0 + 1, rows - 1)
+        c1 = np.minimum(c0 + 1, columns - 1)
+        fr = (r - r0).astype(np.float32)
+        fc = (c - c0).astype(np.float32)
+        data = self.data
+        image = (data[:, r0, c0] * (1 - fc) + data[:, r0, c1] * fc) * (1 - fr) + \
+                (data[:, r1, c0] * (1 - fc) + data[:, r1, c1] * fc) * fr
+        if np.issubdtype(data.dtype, np.integer):
+            # Back to the stored dtype so windowing can use its lookup table
+            info = np.iinfo(data.dtype)
+            image = np.clip(np.rint(image), info.min, info.max).astype(data.dtype)
+            image[:, outside] = info.min
+        else:
+            image[:, outside] = image.min()
+        return image, base, direction
+
+    def close(self):
+        if self.path is not None:
+            data, self.data = self.data, None
+            del data
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
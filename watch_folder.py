@@ -0,0 +1,211 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# A file is handed on once it has had no events (inotify) or has kept the
+# same size and mtime (polling) for this long, so half-written files
+# aren't read
+DEBOUNCE_S = 1.0
+POLL_INTERVAL_S = 2.0
+# How often the inotify loop wakes up with nothing to do, to notice stop()
+IDLE_WAKEUP_S = 0.5
+# Files per batch; a burst arrives as a stream of batches
+MAX_BATCH = 512
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then the name
+
+
+class _Inotify:
+    # Minimal ctypes binding: one watch per directory of the tree
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+        self.dirs = {}  # watch descriptor -> directory
+
+    @classmethod
+    def open(cls):
+        # None where inotify isn't available (not Linux, no libc symbol)
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        return cls(libc, fd) if fd >= 0 else None
+
+    def add_tree(self, root):
+        # False if the per-user watch limit ran out
+        for dirpath, _, _ in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                return False
+            self.dirs[wd] = dirpath
+        return True
+
+    def read(self, timeout):
+        # [(path, is_dir)] of the events that arrive within timeout, or
+        # None if the kernel queue overflowed and events were lost
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            directory = self.dirs.get(wd)
+            if directory is not None and name:
+                events.append((os.path.join(directory, os.fsdecode(name)), bool(mask & IN_ISDIR)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _walk_files(root):
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            yield os.path.join(dirpath, name)
+
+
+class FolderWatcher:
+    # Watches a folder tree for new and changed files on a background
+    # thread and calls on_batch(paths) from that thread with debounced
+    # batches of at most MAX_BATCH paths, oldest first. Files already there
+    # when it starts are not reported. Uses inotify where the platform has
+    # it, and polls (os.stat of the whole tree) otherwise.
+    def __init__(self, root, on_batch, debounce=DEBOUNCE_S, poll_interval=POLL_INTERVAL_S, use_inotify=True):
+        self.root = os.path.abspath(root)
+        self.on_batch = on_batch
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.pending = {}  # path -> time of its last change
+        self.last_flush = 0.0
+        self.error = None
+        self.stopped = threading.Event()
+        self.inotify = _Inotify.open() if use_inotify else None
+        self.known = None  # polling: (mtime, size) of every file at the last poll
+        self.thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+
+    @property
+    def backend(self):
+        return "inotify" if self.inotify is not None else "polling"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _snapshot(self):
+        known = {}
+        for path in _walk_files(self.root):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            known[path] = (stat.st_mtime, stat.st_size)
+        return known
+
+    def _run(self):
+        try:
+            # Walking the tree happens here rather than in the constructor,
+            # which is called from the UI thread
+            if self.inotify is not None and not self.inotify.add_tree(self.root):
+                self.inotify.close()
+                self.inotify = None  # out of watches; poll instead
+            if self.inotify is not None:
+                self._watch_inotify()
+            else:
+                self._watch_polling()
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.inotify is not None:
+                self.inotify.close()
+
+    def _watch_inotify(self):
+        while not self.stopped.is_set():
+            events = self.inotify.read(self._timeout(IDLE_WAKEUP_S))
+            now = time.monotonic()
+            if events is None:
+                # Lost events: everything is a candidate again; the index
+                # skips files whose mtime and size it already has
+                for path in _walk_files(self.root):
+                    self.pending[path] = now
+                events = []
+            for path, is_dir in events:
+                if is_dir:
+                    # A new folder: watch it, and take the files that landed
+                    # in it before the watch was in place
+                    self.inotify.add_tree(path)
+                    for file_path in _walk_files(path):
+                        self.pending[file_path] = now
+                else:
+                    self.pending[path] = now
+            self._flush(now)
+
+    def _watch_polling(self):
+        self.known = self._snapshot()
+        while not self.stopped.wait(self._timeout(self.poll_interval)):
+            now = time.monotonic()
+            current = self._snapshot()
+            for path, state in current.items():
+                if self.known.get(path) != state:
+                    self.pending[path] = now
+            self.known = current
+            self._flush(now)
+
+    def _timeout(self, idle):
+        if not self.pending:
+            return idle
+        due = max(min(self.pending.values()), self.last_flush) + self.debounce - time.monotonic()
+        return min(max(due, 0.01), idle)
+
+    def _flush(self, now):
+        # At most one flush per debounce interval, so a steady stream of
+        # files is handed on in a few large batches rather than one by one
+        if now - self.last_flush < self.debounce:
+            return
+        ready = [path for path, changed in self.pending.items() if now - changed >= self.debounce]
+        if not ready:
+            return
+        self.last_flush = now
+        batch = []
+        for path in ready:
+            del self.pending[path]
+            try:
+                batch.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue  # gone again, e.g. a temporary file
+        batch.sort()
+        for start in range(0, len(batch), MAX_BATCH):
+            if self.stopped.is_set():
+                return
+            self.on_batch([path for _, path in batch[start:start + MAX_BATCH]])
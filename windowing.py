@@ -0,0 +1,94 @@
+from functools import lru_cache
+
+import numpy as np
+
+# (window width, window level) in Hounsfield units
+PRESETS = {
+    "Lung": (1500, -600),
+    "Mediastinum": (350, 50),
+    "Abdomen": (400, 40),
+    "Bone": (2000, 300),
+    "Brain": (80, 40),
+}
+
+# Integer data up to this many bits is windowed through a lookup table
+MAX_LUT_BITS = 16
+
+
+@lru_cache(maxsize=64)
+def build_lut(slope, intercept, window, level, bits, signed, invert=False):
+    # One entry per stored bit pattern, so raw frames can index it directly.
+    # Signed data is looked up through its unsigned view: patterns from
+    # 2**(bits-1) upwards stand for the negative values.
+    stored = np.arange(1 << bits, dtype=np.int64)
+    if signed:
+        stored[1 << (bits - 1):] -= 1 << bits
+    values = stored * slope + intercept
+
+    # DICOM linear VOI function (PS3.3 C.11.2.1.2)
+    width = max(window, 1.0)
+    scaled = ((values - (level - 0.5)) / max(width - 1, 1.0) + 0.5) * 255.0
+    lut = np.clip(np.rint(scaled), 0, 255).astype(np.uint8)
+    if invert:
+        lut = 255 - lut
+    lut.flags.writeable = False
+    return lut
+
+
+def supports_lut(frame):
+    return frame.dtype.kind in 'iu' and frame.dtype.itemsize * 8 <= MAX_LUT_BITS and frame.ndim == 2
+
+
+def apply_window(frame, slope, intercept, window, level, invert=False):
+    # Map a raw stored frame to 8-bit display values
+    if supports_lut(frame):
+        bits = frame.dtype.itemsize * 8
+        lut = build_lut(float(slope), float(intercept), float(window), float(level),
+                        bits, frame.dtype.kind == 'i', invert)
+        if frame.dtype.kind == 'i':
+            frame = frame.view(frame.dtype.str.replace('i', 'u'))
+        return lut[frame]
+
+    if frame.ndim == 3:
+        # Colour images are shown as stored
+        return frame
+
+    # 32-bit and float data are too wide for a table; window them directly
+    values = frame.astype(np.float32) * slope + intercept
+    scaled = ((values - (level - 0.5)) / max(window - 1, 1.0) + 0.5) * 255.0
+    display = np.clip(scaled, 0, 255).astype(np.uint8)
+    return 255 - display if invert else display
+
+
+def downsample(frame, factor):
+    # Block mean over factor x factor pixels, keeping the stored dtype so the
+    # result can still be windowed through a lookup table. Edge rows and
+    # columns that don't fill a block are dropped.
+    if factor <= 1:
+        return frame
+    rows, columns = frame.shape[0] // factor * factor, frame.shape[1] // factor * factor
+    blocks = frame[:rows, :columns].reshape(rows // factor, factor, columns // factor, factor, *frame.shape[2:])
+    means = blocks.mean(axis=(1, 3), dtype=np.float32)
+    if frame.dtype.kind in 'iu':
+        means = np.rint(means)
+    return means.astype(frame.dtype)
+
+
+def default_window(ds, frame, slope, intercept):
+    center = getattr(ds, 'WindowCenter', None)
+    width = getattr(ds, 'WindowWidth', None)
+    if center is not None and width is not None:
+        # Both may be multi-valued; the first pair is the primary window
+        try:
+            center = float(center[0] if hasattr(center, '__len__') and not isinstance(center, str) else center)
+            width = float(width[0] if hasattr(width, '__len__') and not isinstance(width, str) else width)
+        except (TypeError, ValueError, IndexError):
+            center = width = None
+        if center is not None and width is not None and width > 0:
+            return width, center
+
+    low = float(frame.min()) * slope + intercept
+    high = float(frame.max()) * slope + intercept
+    if slope < 0:
+        low, high = high, low
+    return max(high - low, 1.0), (high + low) / 2